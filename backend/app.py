@@ -1,12 +1,26 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 import os
 import logging
-from google_speech import transcribe_audio
-from video_to_audio import convert_video_to_audio
-from gemini_integration import generate_notes, generate_flashcards, generate_mindmap, generate_quiz
-from chat_integration import chat_with_context, clear_conversation
+from transcription import get_engine, ENGINES
+from audio_transcript import model_pool as whisper_pool
+from stt_poller import stt_poller
+from video_to_audio import extract_audio, ExtractionCancelled
+from gemini_integration import generate_notes, generate_summary, generate_flashcards, generate_mindmap, generate_quiz, stream_notes
+from chat_integration import chat_with_context, stream_chat, clear_conversation, configure_persistence, conversation_chains
+import socket
 import threading
+from job_queue import scheduler, QueueFullError, QUEUE_HEARTBEAT_SECONDS
+from dag_executor import Node, run_dag, DagCancelled
+from clients import warm_up
+from llm_cache import llm_cache
+from result_cache import ResultCache, RESULT_CACHE_BYTES
+from search_index import search_index, SEARCH_TOP_K, SEARCH_MAX_K
+from retrieval import drop_index
+from transcript_model import WordTranscript
+from streaming_pipeline import StreamingExtractor, is_streamable, reserve_extractor, release_extractor
+from task_store import create_task_store, TASK_TTL_SECONDS
 import uuid
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
@@ -15,6 +29,7 @@ from dotenv import load_dotenv
 from bson import ObjectId
 from bson.json_util import dumps
 import json
+import time
 import hashlib
 from youtube_processor import process_youtube_video
 import re
@@ -37,9 +52,35 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
 CACHE_FOLDER = "cache"
+STAGING_FOLDER = "staging"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(CACHE_FOLDER, exist_ok=True)
+os.makedirs(STAGING_FOLDER, exist_ok=True)
+
+# How often the progress channel checks a task for changes, and how long one
+# connection stays open before the client is asked to reconnect
+EVENTS_POLL_SECONDS = float(os.environ.get("EVENTS_POLL_SECONDS", 0.5))
+EVENTS_MAX_SECONDS = int(os.environ.get("EVENTS_MAX_SECONDS", 600))
+EVENTS_KEEPALIVE_SECONDS = 15
+
+# Processing results, bounded by RESULT_CACHE_BYTES
+result_cache = ResultCache(CACHE_FOLDER, RESULT_CACHE_BYTES)
+
+# Size of the blocks read from an upload while it is hashed and written to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Chunk size of resumable upload sessions, and the largest chunk a client may ask for
+UPLOAD_SESSION_CHUNK_SIZE = int(os.environ.get("UPLOAD_SESSION_CHUNK_SIZE", 8 * 1024 * 1024))
+MAX_UPLOAD_SESSION_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Largest video a resumable upload session may announce, since its staging file is allocated up front
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 4 * 1024 * 1024 * 1024))
+
+# How often abandoned staging files are swept, and how old an untracked one must be
+# before it is removed (younger ones may be uploads still being written)
+STAGING_SWEEP_SECONDS = int(os.environ.get("STAGING_SWEEP_SECONDS", 3600))
+STAGING_GRACE_SECONDS = int(os.environ.get("STAGING_GRACE_SECONDS", 3600))
 
 # Set the default port
 PORT = int(os.environ.get("PORT", 5001))
@@ -47,9 +88,6 @@ PORT = int(os.environ.get("PORT", 5001))
 # Get GCS bucket name from environment variable
 GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "your-bucket-name")
 
-# Store processing status and results
-processing_tasks = {}
-
 # app/__init__.py
 load_dotenv()
 
@@ -66,6 +104,62 @@ with app.app_context():
 
 bcrypt = Bcrypt(app)
 
+# Create the Gemini and Google Cloud clients without delaying startup
+threading.Thread(target=warm_up, daemon=True).start()
+
+# Store processing status and results where every worker process can see them
+task_store = create_task_store(mongo.db.processing_tasks, expiring_fields=["queue"])
+
+# A published queue entry stops counting once its process misses this many heartbeats
+QUEUE_ENTRY_HEARTBEATS = 3
+
+def publish_queue_position(task_id, position):
+    """Record where a task waits, which process holds it, and until when the entry is valid"""
+    if position is not None:
+        position = dict(
+            position,
+            owner={"host": socket.gethostname(), "pid": os.getpid()},
+            expires_at=time.time() + QUEUE_ENTRY_HEARTBEATS * QUEUE_HEARTBEAT_SECONDS
+        )
+    task_store.update(task_id, {"queue": position})
+
+def live_queue_position(task):
+    """Get a task's published queue position, or None if it is not waiting or its process stopped"""
+    entry = task.get("queue")
+    if not entry or entry.get("expires_at", 0) <= time.time():
+        return None
+    return {"pool": entry["pool"], "position": entry["position"]}
+
+def process_alive(pid):
+    """Whether a process with this ID runs on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def clear_stale_queue_entries():
+    """Clear queue entries left by earlier processes on this host, e.g. before a restart"""
+    host = socket.gethostname()
+    for task_id, entry in task_store.entries("queue").items():
+        owner = entry.get("owner") or {}
+        pid = owner.get("pid")
+        if owner.get("host") == host and (pid == os.getpid() or not isinstance(pid, int) or not process_alive(pid)):
+            task_store.update(task_id, {"queue": None})
+
+# Queues are per process; publish positions to the task store so /status served by
+# any process reports them, and bound the live queued jobs of all processes together
+try:
+    clear_stale_queue_entries()
+except Exception as e:
+    logger.error(f"Error clearing stale queue entries: {str(e)}", exc_info=True)
+scheduler.share_queue(publish_queue_position, lambda: task_store.count_live("queue", time.time()))
+
+# Resumable upload sessions, kept apart from the processing tasks
+upload_store = create_task_store(mongo.db.upload_sessions)
+
 # app/models.py
 class User:
     @staticmethod
@@ -134,6 +228,14 @@ class Metadata:
             {PUSH: {"chatJSON": chat_entry}}
         )
 
+    @staticmethod
+    def get_chat_messages(metadata_id):
+        metadata = mongo.db.metadata.find_one(
+            {"_id": ObjectId(metadata_id)},
+            {"chatJSON": 1}
+        )
+        return metadata.get("chatJSON", []) if metadata else []
+
     @staticmethod
     def add_flashcard(metadata_id, question, answer):
         flashcard = {
@@ -167,32 +269,50 @@ class History:
         return history
 
 
-def get_video_hash(video_name):
-    """Generate a hash for the video name to use as a cache key"""
-    return hashlib.md5(video_name.encode()).hexdigest()
+def get_url_hash(url):
+    """Generate a cache key for a YouTube URL"""
+    return hashlib.md5(url.encode()).hexdigest()
 
-def get_cached_results(video_name):
-    """Check if results for this video are already cached"""
-    video_hash = get_video_hash(video_name)
-    cache_file = os.path.join(CACHE_FOLDER, f"{video_hash}.json")
+def stage_upload(file):
+    """
+    Stream an uploaded file into the staging folder while hashing its bytes.
     
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error reading cache file: {str(e)}")
+    Args:
+        file (FileStorage): The uploaded file
+        
+    Returns:
+        tuple: Path of the staged file and the SHA-256 hex digest of its content
+    """
+    content_hash = hashlib.sha256()
+    staged_path = os.path.join(STAGING_FOLDER, str(uuid.uuid4()))
     
-    return None
+    try:
+        with open(staged_path, 'wb') as f:
+            while True:
+                chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                content_hash.update(chunk)
+                f.write(chunk)
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+    
+    return staged_path, content_hash.hexdigest()
+
+def get_cached_results(cache_key):
+    """Check if results for this content are already cached"""
+    try:
+        return result_cache.get(cache_key)
+    except Exception as e:
+        logger.error(f"Error reading cache: {str(e)}")
+        return None
 
-def save_to_cache(video_name, results):
+def save_to_cache(cache_key, results):
     """Save results to cache for future use"""
-    video_hash = get_video_hash(video_name)
-    cache_file = os.path.join(CACHE_FOLDER, f"{video_hash}.json")
-    
     try:
-        with open(cache_file, 'w') as f:
-            json.dump(results, f)
+        result_cache.put(cache_key, results)
     except Exception as e:
         logger.error(f"Error saving to cache: {str(e)}")
 
@@ -211,78 +331,332 @@ def save_to_history(task_id, file_info, results):
         logger.info(f"Successfully saved to history with id: {result.inserted_id}")
     except Exception as e:
         logger.error(f"Error saving to history: {e}")
+    
+    add_to_search_index(task_id, file_info, results)
 
-def process_video(task_id, video_path, audio_output):
-    """Process video in background thread"""
+def add_to_search_index(task_id, file_info, results):
+    """Append a completed task's notes and transcript to the cross-document search index."""
     try:
-        # Extract video name from the path
-        video_name = os.path.basename(video_path).split('_', 1)[1] if '_' in os.path.basename(video_path) else os.path.basename(video_path)
-        
-        processing_tasks[task_id]["status"] = "converting"
-        # Convert video to audio
-        convert_video_to_audio(video_path, audio_output)
+        search_index.add_task(
+            task_id,
+            file_info,
+            results.get("notes", ""),
+            results.get("transcript", {}).get("text", "")
+        )
+    except Exception as e:
+        logger.error(f"Error adding task {task_id} to search index: {str(e)}")
+
+def get_chat_metadata_id(task_id):
+    """Get the metadata document holding a task's chat turns, creating it on the first turn."""
+    task = task_store.get(task_id, ["chat_metadata_id", "filename", "url"])
+    if task is None:
+        return None
+    if task.get("chat_metadata_id"):
+        return task["chat_metadata_id"]
+    metadata = Metadata.create_metadata(url_path=task.get("url") or task.get("filename", ""))
+    metadata_id = str(metadata["_id"])
+    task_store.update(task_id, {"chat_metadata_id": metadata_id})
+    return metadata_id
+
+def load_chat_history(task_id):
+    """Load the persisted chat turns of a task, oldest first."""
+    task = task_store.get(task_id, ["chat_metadata_id"])
+    if not task or not task.get("chat_metadata_id"):
+        return []
+    return Metadata.get_chat_messages(task["chat_metadata_id"])
+
+def save_chat_turn(task_id, question, answer):
+    """Persist a chat turn so the session survives eviction and restarts."""
+    metadata_id = get_chat_metadata_id(task_id)
+    if metadata_id is not None:
+        Metadata.add_chat_message(metadata_id, question, answer)
+
+configure_persistence(load_chat_history, save_chat_turn)
+
+# Range of overall progress (percent) covered by each task status
+STAGE_PROGRESS = {
+    "uploaded": (0, 0),
+    "converting": (0, 25),
+    "extracting": (0, 25),
+    "transcribing": (25, 55),
+    "summarizing": (55, 99),
+    "generating_notes": (55, 99),
+    "completed": (100, 100)
+}
+
+def progress_fields(status, stage_progress=0):
+    """
+    Build the task fields reporting a status and how far along it is.
+    
+    Args:
+        status (str): Current task status
+        stage_progress (float): Percent of the current stage that is done
         
-        processing_tasks[task_id]["status"] = "transcribing"
-        # Transcribe audio
-        transcript = transcribe_audio(audio_output, bucket_name=GCS_BUCKET_NAME)
+    Returns:
+        dict: Fields for task_store.update with status, stage and overall progress
+    """
+    start, end = STAGE_PROGRESS.get(status, (0, 0))
+    return {
+        "status": status,
+        "stage_progress": round(stage_progress),
+        "progress": round(start + (end - start) * stage_progress / 100)
+    }
+
+def run_stage(task_id, stage, status, fn, *args):
+    """
+    Run a pipeline stage unless its artifact is already checkpointed on the task.
+    
+    Args:
+        task_id (str): ID of the task being processed
+        stage (str): Name of the checkpoint holding the stage's artifact
+        status (str): Task status to report while the stage runs
+        fn (callable): Function producing the artifact
+        
+    Returns:
+        The stage's artifact, either checkpointed or freshly produced
+    """
+    checkpoints = task_store.get(task_id).get("checkpoints", {})
+    if stage in checkpoints:
+        logger.info(f"Task {task_id} resuming past completed stage: {stage}")
+        return checkpoints[stage]
+    
+    task_store.update(task_id, progress_fields(status))
+    artifact = fn(*args)
+    task_store.update(task_id, {f"checkpoints.{stage}": artifact})
+    return artifact
+
+def raise_on_notes_error(notes):
+    """Raise instead of keeping Gemini's error text as notes, so the stage is retried"""
+    if notes.startswith("Error generating notes:"):
+        raise RuntimeError(notes)
+    return notes
+
+def raise_on_artifact_error(name, artifact):
+    """Raise instead of keeping the empty list or error mind map Gemini falls back to, so the node reports an error"""
+    if not artifact:
+        raise RuntimeError(f"Error generating {name}: no items were produced")
+    if isinstance(artifact, dict):
+        for branch in artifact.get("branches", []):
+            if branch.get("type") == "error":
+                details = "; ".join(sub.get("description", "") for sub in branch.get("subbranches", []))
+                raise RuntimeError(f"Error generating {name}: {details}")
+    return artifact
+
+# Derived study artifacts and the node results each one needs. Flashcards, mind
+# map and quiz only need the transcript, so they run alongside the summary.
+STUDY_PACK_NODES = [
+    Node("summary", lambda deps: raise_on_notes_error(generate_summary(deps["transcript"])), ["transcript"]),
+    Node("notes", lambda deps: raise_on_notes_error(generate_notes(deps["transcript"], summary=deps["summary"])),
+         ["transcript", "summary"]),
+    Node("flashcards", lambda deps: raise_on_artifact_error("flashcards", generate_flashcards(deps["transcript"])),
+         ["transcript"], required=False),
+    Node("mindmap", lambda deps: raise_on_artifact_error("mindmap", generate_mindmap(deps["transcript"])),
+         ["transcript"], required=False),
+    Node("quiz", lambda deps: raise_on_artifact_error("quiz", generate_quiz(deps["transcript"])),
+         ["transcript"], required=False)
+]
+
+# Task status reported while a node is running, matching the frontend's steps
+NODE_STATUSES = {
+    "summary": "summarizing",
+    "notes": "generating_notes"
+}
+
+def build_study_pack(task_id, transcript):
+    """
+    Generate every study artifact for a transcript, running independent LLM calls in parallel.
+    
+    Nodes checkpointed by an earlier attempt are not re-run. Each node's status is
+    recorded under the task's "nodes" field as it changes.
+    
+    Args:
+        task_id (str): ID of the task being processed
+        transcript (dict): Transcript with a "text" field
         
+    Returns:
+        dict: Task results including the transcript and all generated artifacts
+    """
+    checkpoints = task_store.get(task_id).get("checkpoints", {})
+    done = {node.name: checkpoints[node.name] for node in STUDY_PACK_NODES if node.name in checkpoints}
+    
+    # Nodes call back from several threads, so progress is tracked under a lock
+    lock = threading.Lock()
+    progress = {"status": "summarizing", "finished": set()}
+    
+    def on_status(name, status, result):
+        with lock:
+            if status in ("completed", "error", "skipped"):
+                progress["finished"].add(name)
+            if status == "running" and name in NODE_STATUSES:
+                progress["status"] = NODE_STATUSES[name]
+            fields = progress_fields(progress["status"], 100 * len(progress["finished"]) / len(STUDY_PACK_NODES))
+            fields[f"nodes.{name}"] = status
+            if status == "completed" and name not in done:
+                fields[f"checkpoints.{name}"] = result
+            task_store.update(task_id, fields)
+    
+    try:
+        pack = run_dag(STUDY_PACK_NODES, {"transcript": transcript["text"]}, on_status=on_status, done=done,
+                       should_cancel=cancel_checker(task_id))
+    except DagCancelled:
+        raise TaskCancelled("generating study artifacts")
+    
+    results = {"transcript": transcript}
+    results.update(pack)
+    results.setdefault("flashcards", [])
+    return results
+
+def fail_task(task_id, error):
+    """Mark a task as failed, keeping its checkpoints so it can be retried"""
+    logger.error(f"Error during processing of task {task_id}: {str(error)}", exc_info=True)
+    task_store.update(task_id, {"status": "error", "error": str(error)})
+
+class SourceUnavailable(Exception):
+    """Raised when a task has to go back to a stage whose input file is gone."""
+
+class TaskCancelled(Exception):
+    """Raised when a task stops at a stage boundary because /cancel was called for it."""
+
+def raise_if_cancelled(task_id, stage):
+    """Stop a task before a stage if its cancellation was requested"""
+    task = task_store.get(task_id, fields=["cancel_requested"])
+    if task and task.get("cancel_requested"):
+        raise TaskCancelled(stage)
+
+def cancel_task_run(task_id, stage):
+    """Mark a task as cancelled, keeping its checkpoints so it can be retried"""
+    logger.info(f"Task {task_id} cancelled: {stage}")
+    task_store.update(task_id, {"status": "error", "error": "Cancelled"})
+
+def remove_files(*paths):
+    """Delete temporary files that exist"""
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def complete_transcript_stage(task_id, transcript, **fields):
+    """
+    Checkpoint a finished transcription and hand the task back to the io pool,
+    where process_audio resumes past it.
+    
+    Args:
+        task_id (str): ID of the task being processed
+        transcript (dict): Result passed to a transcription's on_complete
+        fields: Extra task fields to set with the checkpoint
+    """
+    try:
+        # Record how the audio was recognized on the task rather than in the results
+        stt = transcript.pop("stt", None)
         if not transcript["text"]:
-            processing_tasks[task_id]["status"] = "error"
-            processing_tasks[task_id]["error"] = "Transcription failed"
+            raise RuntimeError(transcript.get("error", "Transcription failed"))
+        fields["checkpoints.transcript"] = transcript
+        if stt:
+            fields["stt"] = stt
+        task_store.update(task_id, fields)
+        scheduler.handoff("io", task_id, process_audio, task_id)
+    except Exception as e:
+        fail_task(task_id, e)
+
+def start_transcript_stage(task_id, audio_path, engine=None):
+    """Submit extracted audio to the task's transcription engine and return without waiting."""
+    get_engine(engine).start(
+        audio_path,
+        lambda transcript: complete_transcript_stage(task_id, transcript)
+    )
+
+def progress_reporter(task_id, status, step=5):
+    """Build a callback recording a stage's percent done whenever it advances by step."""
+    reported = {"progress": 0}
+    
+    def report(stage_progress):
+        if stage_progress - reported["progress"] >= step:
+            reported["progress"] = stage_progress
+            task_store.update(task_id, progress_fields(status, stage_progress))
+    
+    return report
+
+def cancel_checker(task_id, interval=1.0):
+    """Build a hook reporting whether cancellation was requested, reading the task at most every interval."""
+    checked = {"at": 0, "cancel": False}
+    
+    def should_cancel():
+        if time.time() - checked["at"] >= interval:
+            checked["at"] = time.time()
+            task = task_store.get(task_id, fields=["cancel_requested"])
+            checked["cancel"] = bool(task and task.get("cancel_requested"))
+        return checked["cancel"]
+    
+    return should_cancel
+
+def process_video(task_id):
+    """Convert video to audio in the media pool, then hand off to the io pool"""
+    try:
+        task = task_store.get(task_id)
+        audio_path = task["audio_path"]
+        
+        # The audio checkpoint is only usable while the file is still on disk
+        if "audio" not in task.get("checkpoints", {}) or not os.path.exists(audio_path):
+            if not os.path.exists(task["video_path"]):
+                raise SourceUnavailable("Source video is no longer available, please upload it again")
+            task_store.update(task_id, progress_fields("converting"))
+            # Extract the audio track straight to 16 kHz mono FLAC
+            extract_audio(
+                task["video_path"],
+                audio_path,
+                on_progress=progress_reporter(task_id, "converting"),
+                should_cancel=cancel_checker(task_id)
+            )
+            task_store.update(task_id, {"checkpoints.audio": audio_path})
+        
+        # Transcription and note generation only wait on Google APIs
+        scheduler.handoff("io", task_id, process_audio, task_id)
+    
+    except ExtractionCancelled:
+        cancel_task_run(task_id, "extracting audio")
+    except Exception as e:
+        fail_task(task_id, e)
+
+def process_audio(task_id):
+    """Transcribe extracted audio and generate notes in the io pool"""
+    try:
+        task = task_store.get(task_id)
+        checkpoints = task.get("checkpoints", {})
+        
+        # Transcribe audio; the worker is released while Speech-to-Text runs
+        if "transcript" not in checkpoints:
+            raise_if_cancelled(task_id, "transcribing")
+            task_store.update(task_id, progress_fields("transcribing"))
+            start_transcript_stage(task_id, task["audio_path"], task.get("engine"))
             return
+        transcript = checkpoints["transcript"]
+        logger.info(f"Task {task_id} resuming past completed stage: transcript")
         
-        # Generate title
-        title = audio_output.split('/')[-1].split('.')[0]
+        # The video is only needed to re-extract audio, which the transcript checkpoint makes unnecessary
+        remove_files(task.get("video_path"))
         
-        processing_tasks[task_id]["status"] = "summarizing"
-        # Generate summary
-        summary = generate_notes(f'Please provide a concise summary of the following text:\n{transcript["text"]}')
-        
-        processing_tasks[task_id]["status"] = "generating_notes"
-        # Generate notes
-        try:
-            notes = generate_notes(f'Summary: {summary} \n\n\nNotes:\n{transcript["text"]}')
-        except Exception as notes_error:
-            logger.error(f"Error generating notes: {str(notes_error)}", exc_info=True)
-            notes = f"Error generating notes: {str(notes_error)}"
-            
-        # Store results without generating flashcards
-        results = {
-            "transcript": transcript,
-            "summary": summary,
-            "notes": notes,
-            "flashcards": []  # Initialize with empty flashcards array
-        }
+        raise_if_cancelled(task_id, "generating study artifacts")
+        results = build_study_pack(task_id, transcript)
         
         # Save results to cache
-        save_to_cache(video_name, results)
+        save_to_cache(task["cache_key"], results)
         
         # Save to history with file info
         file_info = {
             'type': 'video',
-            'filename': os.path.basename(video_path),
+            'filename': os.path.basename(task["video_path"]),
             'source': 'upload'
         }
         save_to_history(task_id, file_info, results)
         
-        processing_tasks[task_id]["status"] = "completed"
-        processing_tasks[task_id]["results"] = results
+        task_store.update(task_id, dict(progress_fields("completed", 100), results=results))
         
         # Clean up temporary files
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        if os.path.exists(audio_output):
-            os.remove(audio_output)
+        remove_files(task["video_path"], task["audio_path"])
             
+    except TaskCancelled as e:
+        cancel_task_run(task_id, str(e))
     except Exception as e:
-        logger.error(f"Error during processing: {str(e)}", exc_info=True)
-        processing_tasks[task_id]["status"] = "error"
-        processing_tasks[task_id]["error"] = str(e)
-        # Clean up temporary files in case of error
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        if os.path.exists(audio_output):
-            os.remove(audio_output)
+        fail_task(task_id, e)
 
 def get_video_id(url):
     """Extract video ID from YouTube URL."""
@@ -301,47 +675,40 @@ def get_video_id(url):
         logger.error(f"Error extracting video ID: {str(e)}")
         return None
 
-def process_youtube_video(task_id, url):
+def fetch_youtube_transcript(url):
+    """Fetch and join the published transcript of a YouTube video"""
+    # Get video ID from URL
+    video_id = get_video_id(url)
+    if not video_id:
+        raise ValueError("Invalid YouTube URL")
+    
+    transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+    
+    # Combine transcript segments into a single text, timing words within each caption
+    word_transcript = WordTranscript.from_segments(transcript_list)
+    return {
+        "text": word_transcript.text,
+        "confidence": 1.0,  # YouTube transcripts are pre-generated
+        "words": word_transcript.to_dict()
+    }
+
+def process_youtube_video(task_id):
     """Process YouTube video in background thread"""
     try:
-        processing_tasks[task_id]["status"] = "uploaded"
-
-        # Get video ID from URL
-        video_id = get_video_id(url)
-        if not video_id:
-            raise ValueError("Invalid YouTube URL")
-
-        # Get transcript from YouTube
-        processing_tasks[task_id]["status"] = "transcribing"
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        
-        # Combine transcript segments into a single text
-        transcript_text = " ".join([segment["text"] for segment in transcript_list])
+        url = task_store.get(task_id)["url"]
         
-        # Generate summary
-        processing_tasks[task_id]["status"] = "summarizing"
-        summary = generate_notes(f'Please provide a concise summary of the following text:\n{transcript_text}')
+        # Get transcript from YouTube
+        raise_if_cancelled(task_id, "transcribing")
+        transcript = run_stage(task_id, "transcript", "transcribing", fetch_youtube_transcript, url)
         
-        # Generate notes using the transcript
-        processing_tasks[task_id]["status"] = "generating_notes"
-        notes = generate_notes(f'Summary: {summary} \n\n\nNotes:\n{transcript_text}')
+        raise_if_cancelled(task_id, "generating study artifacts")
+        results = build_study_pack(task_id, transcript)
         
         # Update task status and results
-        processing_tasks[task_id].update({
-            "status": "completed",
-            "results": {
-                "transcript": {
-                    "text": transcript_text,
-                    "confidence": 1.0  # YouTube transcripts are pre-generated
-                },
-                "summary": summary,
-                "notes": notes,
-                "flashcards": []  # Initialize with empty flashcards array
-            }
-        })
+        task_store.update(task_id, dict(progress_fields("completed", 100), results=results))
         
         # Cache the results
-        save_to_cache(url, processing_tasks[task_id]["results"])
+        save_to_cache(get_url_hash(url), results)
         
         # Save to history with file info
         file_info = {
@@ -349,79 +716,105 @@ def process_youtube_video(task_id, url):
             'url': url,
             'source': 'youtube'
         }
-        save_to_history(task_id, file_info, processing_tasks[task_id]["results"])
+        save_to_history(task_id, file_info, results)
         
+    except TaskCancelled as e:
+        cancel_task_run(task_id, str(e))
     except Exception as e:
-        logger.error(f"Error during YouTube processing: {str(e)}", exc_info=True)
-        processing_tasks[task_id]["status"] = "error"
-        processing_tasks[task_id]["error"] = str(e)
+        fail_task(task_id, e)
 
-def process_pdf(task_id, pdf_path):
+def extract_pdf_text(pdf_path):
+    """Extract the text of every page of a PDF"""
+    reader = PdfReader(pdf_path)
+    text = "\n".join(page.extract_text() for page in reader.pages) + "\n"
+    
+    if not text.strip():
+        raise RuntimeError("No text could be extracted from PDF")
+    
+    return {
+        "text": text,
+        "confidence": 1.0  # PDF text extraction is deterministic
+    }
+
+def process_pdf(task_id):
     """Process PDF in background thread"""
     try:
-        # Extract PDF name from the path
-        pdf_name = os.path.basename(pdf_path).split('_', 1)[1] if '_' in os.path.basename(pdf_path) else os.path.basename(pdf_path)
+        task = task_store.get(task_id)
         
-        processing_tasks[task_id]["status"] = "extracting"
         # Extract text from PDF
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        
-        if not text.strip():
-            processing_tasks[task_id]["status"] = "error"
-            processing_tasks[task_id]["error"] = "No text could be extracted from PDF"
-            return
+        raise_if_cancelled(task_id, "extracting text")
+        transcript = run_stage(task_id, "transcript", "extracting", extract_pdf_text, task["pdf_path"])
         
-        # Generate summary
-        processing_tasks[task_id]["status"] = "summarizing"
-        summary = generate_notes(f'Please provide a concise summary of the following text:\n{text}')
-        
-        processing_tasks[task_id]["status"] = "generating_notes"
-        # Generate notes
-        try:
-            notes = generate_notes(f'Summary: {summary} \n\n\nNotes:\n{text}')
-        except Exception as notes_error:
-            logger.error(f"Error generating notes: {str(notes_error)}", exc_info=True)
-            notes = f"Error generating notes: {str(notes_error)}"
-            
-        # Store results without generating flashcards
-        results = {
-            "transcript": {
-                "text": text,
-                "confidence": 1.0  # PDF text extraction is deterministic
-            },
-            "summary": summary,
-            "notes": notes,
-            "flashcards": []  # Initialize with empty flashcards array
-        }
+        raise_if_cancelled(task_id, "generating study artifacts")
+        results = build_study_pack(task_id, transcript)
         
         # Save results to cache
-        save_to_cache(pdf_name, results)
+        save_to_cache(task["cache_key"], results)
         
         # Save to history with file info
         file_info = {
             'type': 'pdf',
-            'filename': os.path.basename(pdf_path),
+            'filename': os.path.basename(task["pdf_path"]),
             'source': 'upload'
         }
         save_to_history(task_id, file_info, results)
         
-        processing_tasks[task_id]["status"] = "completed"
-        processing_tasks[task_id]["results"] = results
+        task_store.update(task_id, dict(progress_fields("completed", 100), results=results))
         
         # Clean up temporary files
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
+        remove_files(task["pdf_path"])
             
+    except TaskCancelled as e:
+        cancel_task_run(task_id, str(e))
     except Exception as e:
-        logger.error(f"Error during processing: {str(e)}", exc_info=True)
-        processing_tasks[task_id]["status"] = "error"
-        processing_tasks[task_id]["error"] = str(e)
-        # Clean up temporary files in case of error
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
+        fail_task(task_id, e)
+
+def submit_pipeline(task_id, task, admitted=False):
+    """
+    Queue a task's pipeline, resuming at the first stage without a checkpoint.
+    
+    Raises:
+        QueueFullError: If the task is new and the queue is at capacity
+        SourceUnavailable: If the video is gone and no later stage is checkpointed
+    """
+    enqueue = scheduler.handoff if admitted else scheduler.submit
+    pipeline = task["pipeline"]
+    
+    if pipeline == "video":
+        checkpoints = task.get("checkpoints", {})
+        if "transcript" in checkpoints or ("audio" in checkpoints and os.path.exists(task["audio_path"])):
+            enqueue("io", task_id, process_audio, task_id)
+        elif os.path.exists(task["video_path"]):
+            enqueue("media", task_id, process_video, task_id)
+        else:
+            raise SourceUnavailable("Source video is no longer available, please upload it again")
+    elif pipeline == "pdf":
+        # Text extraction is cheap next to the LLM calls
+        enqueue("io", task_id, process_pdf, task_id)
+    elif pipeline == "youtube":
+        enqueue("io", task_id, process_youtube_video, task_id)
+    else:
+        raise ValueError(f"Unknown pipeline: {pipeline}")
+
+def resume_interrupted_tasks():
+    """Re-queue tasks that were still being processed when the server stopped"""
+    for task_id, task in task_store.all().items():
+        if task["status"] in ("completed", "error") or "pipeline" not in task:
+            continue
+        logger.info(f"Resuming interrupted task {task_id} from status: {task['status']}")
+        try:
+            submit_pipeline(task_id, task, admitted=True)
+        except SourceUnavailable as e:
+            fail_task(task_id, e)
+
+def queue_full_response(error):
+    """Build a 429 response telling the client when to retry."""
+    response = jsonify({
+        "error": "Server is busy, please retry later",
+        "retry_after": error.retry_after
+    })
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
 
 @app.route("/health", methods=["GET"])
 def health_check():
@@ -438,6 +831,97 @@ def health_check():
             "error": str(e)
         }), 500
 
+def requested_engine(engine):
+    """
+    Validate a transcription engine asked for by a request.
+    
+    Raises:
+        ValueError: If the engine is unknown
+    """
+    if engine and engine not in ENGINES:
+        raise ValueError(f"Unknown transcription engine: {engine}. Choose one of: {', '.join(ENGINES)}")
+    return engine or None
+
+def start_cached_task(task_id, cache_key, cached_results, message="File found in cache", **fields):
+    """
+    Record a task answered from the results cache, so every upload path creates the same shape.
+    
+    Args:
+        task_id (str): ID for the new task
+        cache_key (str): Key the results were cached under
+        cached_results (dict): The cached results
+        message (str): Message returned to the client
+        fields: Fields describing the source, such as filename or url
+        
+    Returns:
+        tuple: JSON response and status code
+    """
+    task_store.create(task_id, dict(fields, status="completed", cache_key=cache_key, results=cached_results, cached=True))
+    return jsonify({
+        "message": message,
+        "task_id": task_id,
+        "status": "completed",
+        "cached": True
+    }), 200
+
+def start_video_task(task_id, filename, staged_path, cache_key, keep_if_full=False, engine=None):
+    """
+    Start processing a fully staged video, or answer from the cache.
+    
+    Args:
+        task_id (str): ID for the new task
+        filename (str): Original name of the video
+        staged_path (str): Path of the video in the staging folder
+        cache_key (str): SHA-256 hex digest of the video
+        keep_if_full (bool): Put the video back in staging instead of deleting
+            it when the queue is full, so the client can retry without re-uploading
+        engine (str): Transcription engine, defaults to TRANSCRIPTION_ENGINE
+        
+    Returns:
+        tuple: JSON response and status code
+    """
+    # Check if this video is already in the cache
+    cached_results = get_cached_results(cache_key)
+    if cached_results:
+        os.remove(staged_path)
+        return start_cached_task(task_id, cache_key, cached_results, filename=filename)
+
+    video_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{filename}")
+    audio_output = os.path.join(OUTPUT_FOLDER, f"{task_id}_{os.path.splitext(filename)[0]}.flac")
+
+    # Move the staged video into the upload folder
+    os.replace(staged_path, video_path)
+    
+    # Initialize task status
+    task = {
+        "status": "uploaded",
+        "filename": filename,
+        "cache_key": cache_key,
+        "pipeline": "video",
+        "video_path": video_path,
+        "audio_path": audio_output
+    }
+    if engine:
+        task["engine"] = engine
+    task_store.create(task_id, task)
+    
+    # Queue processing, starting with audio extraction in the media pool
+    try:
+        submit_pipeline(task_id, task)
+    except QueueFullError as e:
+        task_store.delete(task_id)
+        if keep_if_full:
+            os.replace(video_path, staged_path)
+        else:
+            os.remove(video_path)
+        return queue_full_response(e)
+    
+    return jsonify({
+        "message": "File uploaded successfully",
+        "task_id": task_id,
+        "status": "uploaded"
+    }), 200
+
 @app.route("/upload", methods=["POST"])
 def upload_video():
     """Handles video upload and initiates processing."""
@@ -451,56 +935,383 @@ def upload_video():
             logger.error("Empty filename received")
             return jsonify({"error": "No file selected"}), 400
 
+        try:
+            engine = requested_engine(request.form.get("engine") or request.args.get("engine"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Generate unique task ID
         task_id = str(uuid.uuid4())
         
-        # Check if this video is already in the cache
-        cached_results = get_cached_results(file.filename)
-        if cached_results:
-            # Initialize task status with cached results
-            processing_tasks[task_id] = {
-                "status": "completed",
-                "filename": file.filename,
-                "results": cached_results,
-                "cached": True
-            }
-            
-            return jsonify({
-                "message": "File found in cache",
-                "task_id": task_id,
-                "status": "completed",
-                "cached": True
-            }), 200
+        # Hash the video while it is written to the staging folder
+        staged_path, cache_key = stage_upload(file)
+        
+        return start_video_task(task_id, file.filename, staged_path, cache_key, engine=engine)
 
-        video_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{file.filename}")
-        audio_output = os.path.join(OUTPUT_FOLDER, f"{task_id}_{os.path.splitext(file.filename)[0]}.mp3")
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
-        # Save video file
-        file.save(video_path)
+@app.route("/upload/stream", methods=["POST"])
+def upload_video_stream():
+    """
+    Streaming video upload: the raw request body is the video, named by ?filename=.
+    
+    Audio is demuxed and transcribed segment by segment while the body is still
+    arriving, so by the time the upload ends most of the transcript is done.
+    Containers that cannot be read front to back (MP4 with its index at the
+    end) fall back to the regular pipeline once the upload is saved. At most
+    STREAM_MAX_EXTRACTORS uploads are decoded at once; beyond that the upload
+    is rejected with 429 before its body is read.
+    
+    Clients that know the video's SHA-256 should pass it as ?sha256=: a video
+    already in the results cache is then answered before any of it is read or
+    transcribed. The hash is checked against the received body otherwise.
+    """
+    try:
+        filename = secure_filename(request.args.get("filename", ""))
+        if not filename:
+            logger.error("No filename provided for streaming upload")
+            return jsonify({"error": "No filename provided"}), 400
+        try:
+            engine = requested_engine(request.args.get("engine"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Answer a known video from the cache without paying for its transcription
+        expected_hash = request.args.get("sha256", "").lower()
+        if expected_hash:
+            cached_results = get_cached_results(expected_hash)
+            if cached_results:
+                return start_cached_task(str(uuid.uuid4()), expected_hash, cached_results, filename=filename)
+        
+        # Segments are transcribed as they arrive only by Google Speech
+        streaming = get_engine(engine).name == "google"
+        # Decoding while the body arrives runs outside the media pool, so it has its own cap
+        if streaming and not reserve_extractor():
+            logger.warning("Rejecting streaming upload: every stream extractor is busy")
+            return queue_full_response(QueueFullError(max(1, int(round(scheduler.pools["media"].estimated_wait())))))
         
-        # Initialize task status
-        processing_tasks[task_id] = {
-            "status": "uploaded",
-            "filename": file.filename
+        task_id = str(uuid.uuid4())
+        staged_path = os.path.join(STAGING_FOLDER, str(uuid.uuid4()))
+        video_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{filename}")
+        audio_output = os.path.join(OUTPUT_FOLDER, f"{task_id}_{os.path.splitext(filename)[0]}.wav")
+        task = {
+            "status": "transcribing",
+            "filename": filename,
+            "pipeline": "video",
+            "video_path": video_path,
+            "audio_path": audio_output
         }
+        if engine:
+            task["engine"] = engine
+        
+        def fall_back():
+            # Decoding failed after the upload was saved, process it as a regular upload
+            task_store.update(task_id, {"status": "uploaded"})
+            submit_pipeline(task_id, task_store.get(task_id), admitted=True)
+        
+        extractor = None
+        # The reserved slot passes to the extractor once one is started
+        slot_reserved = streaming
+        content_hash = hashlib.sha256()
+        try:
+            task_store.create(task_id, task)
+            with open(staged_path, 'wb') as f:
+                while True:
+                    chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    # Only the start of the upload says whether its index comes first
+                    if streaming and f.tell() == 0 and is_streamable(chunk):
+                        slot_reserved = False
+                        extractor = StreamingExtractor(
+                            audio_output,
+                            lambda transcript: complete_transcript_stage(task_id, transcript, **{"checkpoints.audio": audio_output}),
+                            fall_back,
+                            bucket_name=GCS_BUCKET_NAME
+                        )
+                    content_hash.update(chunk)
+                    f.write(chunk)
+                    if extractor is not None:
+                        extractor.feed(chunk)
+        except Exception:
+            if extractor is not None:
+                extractor.cancel()
+            task_store.delete(task_id)
+            remove_files(staged_path, audio_output)
+            raise
+        finally:
+            if slot_reserved:
+                release_extractor()
+        
+        cache_key = content_hash.hexdigest()
+        
+        if expected_hash and expected_hash != cache_key:
+            if extractor is not None:
+                extractor.cancel()
+            task_store.delete(task_id)
+            remove_files(staged_path, audio_output)
+            return jsonify({"error": "File checksum mismatch"}), 422
+        
+        # Without a hash up front, a cached video is only recognized once fully read
+        cached_results = get_cached_results(cache_key)
+        if cached_results:
+            if extractor is not None:
+                extractor.cancel()
+            remove_files(staged_path, audio_output)
+            return start_cached_task(task_id, cache_key, cached_results, filename=filename)
         
-        # Start processing in background thread
-        thread = threading.Thread(
-            target=process_video,
-            args=(task_id, video_path, audio_output)
-        )
-        thread.start()
+        # Move the staged video into the upload folder
+        os.replace(staged_path, video_path)
+        task_store.update(task_id, {"cache_key": cache_key})
+        
+        if extractor is not None and extractor.finish():
+            logger.info(f"Upload for task {task_id} finished, transcription continues from the stream")
+        else:
+            logger.info(f"Task {task_id} is not streamable, processing the saved upload")
+            task_store.update(task_id, {"status": "uploaded"})
+            try:
+                submit_pipeline(task_id, task_store.get(task_id))
+            except QueueFullError as e:
+                task_store.delete(task_id)
+                os.remove(video_path)
+                return queue_full_response(e)
         
         return jsonify({
             "message": "File uploaded successfully",
             "task_id": task_id,
-            "status": "uploaded"
+            "status": task_store.get(task_id, fields=["status"])["status"]
         }), 200
-
+    
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
+def received_ranges(chunks, chunk_size, size):
+    """Merge received chunk indexes into [start, end) byte ranges."""
+    ranges = []
+    for index in sorted(int(index) for index in chunks):
+        start, end = index * chunk_size, min((index + 1) * chunk_size, size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+def hash_file(path):
+    """SHA-256 hex digest of a file's content, read in UPLOAD_CHUNK_SIZE blocks."""
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+def sweep_staging():
+    """
+    Delete staging files left behind by abandoned uploads.
+    
+    A file is removed when no upload session owns it and it has not been
+    written for STAGING_GRACE_SECONDS, or when its session has seen no chunk
+    for TASK_TTL_SECONDS, the point at which Mongo expires the session.
+    
+    Returns:
+        int: Number of files removed
+    """
+    removed = 0
+    now = time.time()
+    for name in os.listdir(STAGING_FOLDER):
+        path = os.path.join(STAGING_FOLDER, name)
+        try:
+            age = now - os.path.getmtime(path)
+            if age < STAGING_GRACE_SECONDS:
+                continue
+            # Upload sessions are staged under their upload ID, other uploads under a fresh UUID
+            session = upload_store.get(name, fields=["staged_path"])
+            if session is not None and age < TASK_TTL_SECONDS:
+                continue
+            os.remove(path)
+            if session is not None:
+                upload_store.delete(name)
+            removed += 1
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error(f"Error sweeping staging file {path}: {str(e)}", exc_info=True)
+    if removed:
+        logger.info(f"Removed {removed} abandoned staging files")
+    return removed
+
+def sweep_staging_periodically():
+    """Run sweep_staging every STAGING_SWEEP_SECONDS for the life of the process."""
+    while True:
+        time.sleep(STAGING_SWEEP_SECONDS)
+        try:
+            sweep_staging()
+        except Exception as e:
+            logger.error(f"Error sweeping staging folder: {str(e)}", exc_info=True)
+
+threading.Thread(target=sweep_staging_periodically, name="staging-sweeper", daemon=True).start()
+
+@app.route("/uploads", methods=["POST"])
+def create_upload_session():
+    """
+    Start a resumable upload of a video.
+    
+    The client then PUTs numbered chunks, may GET the session to see which
+    byte ranges have arrived, and finally POSTs to /finalize.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get("filename", ""))
+    size = data.get("size")
+    if not filename or not isinstance(size, int) or size <= 0:
+        return jsonify({"error": "filename and a positive integer size are required"}), 400
+    if size > MAX_UPLOAD_BYTES:
+        return jsonify({"error": f"size must be at most {MAX_UPLOAD_BYTES} bytes"}), 413
+    
+    try:
+        engine = requested_engine(data.get("engine"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    chunk_size = data.get("chunk_size", UPLOAD_SESSION_CHUNK_SIZE)
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= MAX_UPLOAD_SESSION_CHUNK_SIZE:
+        return jsonify({"error": f"chunk_size must be between 1 and {MAX_UPLOAD_SESSION_CHUNK_SIZE}"}), 400
+    
+    upload_id = str(uuid.uuid4())
+    staged_path = os.path.join(STAGING_FOLDER, upload_id)
+    # Chunks are written in place at their offsets, in any order
+    with open(staged_path, 'wb') as f:
+        f.truncate(size)
+    
+    upload_store.create(upload_id, {
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "staged_path": staged_path,
+        "engine": engine,
+        "chunks": {}
+    })
+    return jsonify({
+        "upload_id": upload_id,
+        "chunk_size": chunk_size,
+        "chunk_count": -(-size // chunk_size)
+    }), 201
+
+@app.route("/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def upload_chunk(upload_id, index):
+    """Write one chunk of a resumable upload; the X-Chunk-SHA256 header is its checksum."""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload session not found"}), 404
+    if session.get("state") == "finalizing":
+        return jsonify({"error": "Upload is being finalized"}), 409
+    
+    chunk_size, size = session["chunk_size"], session["size"]
+    offset = index * chunk_size
+    if offset >= size:
+        return jsonify({"error": f"Chunk index out of range: {index}"}), 400
+    expected_length = min(chunk_size, size - offset)
+    
+    checksum = request.headers.get("X-Chunk-SHA256", "").lower()
+    if not checksum:
+        return jsonify({"error": "Missing X-Chunk-SHA256 header"}), 400
+    
+    chunk = request.stream.read(expected_length + 1)
+    if len(chunk) != expected_length:
+        return jsonify({"error": f"Chunk {index} must be {expected_length} bytes, got {len(chunk)}"}), 400
+    if hashlib.sha256(chunk).hexdigest() != checksum:
+        return jsonify({"error": f"Checksum mismatch for chunk {index}"}), 422
+    
+    # Positional writes let chunks arrive concurrently and out of order
+    try:
+        fd = os.open(session["staged_path"], os.O_WRONLY)
+        try:
+            os.pwrite(fd, chunk, offset)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except FileNotFoundError:
+        # Finalized or aborted since the session was read
+        return jsonify({"error": "Upload session not found"}), 404
+    except OSError as e:
+        logger.error(f"Error writing chunk {index} of upload {upload_id}: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Error writing chunk {index}: {str(e)}"}), 500
+    
+    if upload_store.get(upload_id, fields=["size"]) is None:
+        return jsonify({"error": "Upload session was finalized or aborted while the chunk was written"}), 409
+    upload_store.update(upload_id, {f"chunks.{index}": checksum})
+    
+    return jsonify({"status": "success", "index": index}), 200
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload_session(upload_id):
+    """Report which byte ranges and chunks of a resumable upload have arrived."""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload session not found"}), 404
+    
+    chunk_count = -(-session["size"] // session["chunk_size"])
+    return jsonify({
+        "upload_id": upload_id,
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "received": received_ranges(session["chunks"], session["chunk_size"], session["size"]),
+        "missing_chunks": [index for index in range(chunk_count) if str(index) not in session["chunks"]]
+    }), 200
+
+@app.route("/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload_session(upload_id):
+    """Check a resumable upload is complete and start processing it like /upload."""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload session not found"}), 404
+    
+    chunk_count = -(-session["size"] // session["chunk_size"])
+    missing = [index for index in range(chunk_count) if str(index) not in session["chunks"]]
+    if missing:
+        return jsonify({"error": "Upload is incomplete", "missing_chunks": missing}), 409
+    
+    # Only one request may hash and hand off the staged file
+    if not upload_store.claim(upload_id, "state", None, "finalizing"):
+        return jsonify({"error": "Upload is already being finalized"}), 409
+    
+    try:
+        cache_key = hash_file(session["staged_path"])
+        expected_hash = (request.get_json(silent=True) or {}).get("sha256")
+        if expected_hash and expected_hash.lower() != cache_key:
+            upload_store.update(upload_id, {"state": None})
+            return jsonify({"error": "File checksum mismatch"}), 422
+        
+        response, status_code = start_video_task(
+            str(uuid.uuid4()), session["filename"], session["staged_path"], cache_key,
+            keep_if_full=True, engine=session.get("engine")
+        )
+        # A full queue keeps the session so finalize can simply be retried
+        if status_code == 429:
+            upload_store.update(upload_id, {"state": None})
+        else:
+            upload_store.delete(upload_id)
+        return response, status_code
+    
+    except Exception as e:
+        logger.error(f"Error finalizing upload {upload_id}: {str(e)}", exc_info=True)
+        upload_store.update(upload_id, {"state": None})
+        return jsonify({"error": f"Error finalizing upload: {str(e)}"}), 500
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload_session(upload_id):
+    """Abandon a resumable upload and delete its partial file."""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload session not found"}), 404
+    if session.get("state") == "finalizing":
+        return jsonify({"error": "Upload is being finalized"}), 409
+    remove_files(session["staged_path"])
+    upload_store.delete(upload_id)
+    return jsonify({"status": "success"}), 200
+
 @app.route("/upload-pdf", methods=["POST"])
 def upload_pdf():
     """Handles PDF upload and initiates processing."""
@@ -521,41 +1332,37 @@ def upload_pdf():
         # Generate unique task ID
         task_id = str(uuid.uuid4())
         
+        # Hash the PDF while it is written to the staging folder
+        staged_path, cache_key = stage_upload(file)
+        
         # Check if this PDF is already in the cache
-        cached_results = get_cached_results(file.filename)
+        cached_results = get_cached_results(cache_key)
         if cached_results:
-            # Initialize task status with cached results
-            processing_tasks[task_id] = {
-                "status": "completed",
-                "filename": file.filename,
-                "results": cached_results,
-                "cached": True
-            }
-            
-            return jsonify({
-                "message": "File found in cache",
-                "task_id": task_id,
-                "status": "completed",
-                "cached": True
-            }), 200
+            os.remove(staged_path)
+            return start_cached_task(task_id, cache_key, cached_results, filename=file.filename)
 
         pdf_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{file.filename}")
 
-        # Save PDF file
-        file.save(pdf_path)
+        # Move the staged PDF into the upload folder
+        os.replace(staged_path, pdf_path)
         
         # Initialize task status
-        processing_tasks[task_id] = {
+        task = {
             "status": "uploaded",
-            "filename": file.filename
+            "filename": file.filename,
+            "cache_key": cache_key,
+            "pipeline": "pdf",
+            "pdf_path": pdf_path
         }
+        task_store.create(task_id, task)
         
-        # Start processing in background thread
-        thread = threading.Thread(
-            target=process_pdf,
-            args=(task_id, pdf_path)
-        )
-        thread.start()
+        # Queue processing
+        try:
+            submit_pipeline(task_id, task)
+        except QueueFullError as e:
+            task_store.delete(task_id)
+            os.remove(pdf_path)
+            return queue_full_response(e)
         
         return jsonify({
             "message": "File uploaded successfully",
@@ -570,11 +1377,10 @@ def upload_pdf():
 @app.route("/status/<task_id>", methods=["GET"])
 def get_status(task_id):
     """Get the status and results of a processing task."""
-    if task_id not in processing_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         logger.error(f"Task not found: {task_id}")
         return jsonify({"error": "Task not found"}), 404
-        
-    task = processing_tasks[task_id]
     
     response = {
         "status": task["status"]
@@ -590,6 +1396,24 @@ def get_status(task_id):
     if "cached" in task:
         response["cached"] = task["cached"]
     
+    # Report the progress of each study artifact
+    if task.get("nodes"):
+        response["nodes"] = task["nodes"]
+    
+    # Report how the audio was transcribed
+    if task.get("stt"):
+        response["stt"] = task["stt"]
+    
+    # Report which checkpointed stages a retry would skip
+    if task.get("checkpoints"):
+        response["completed_stages"] = list(task["checkpoints"].keys())
+    
+    # Report where the task is waiting if it has not started yet; the position is
+    # within the queue of the process holding the task, not across all processes
+    queue_position = live_queue_position(task)
+    if queue_position:
+        response["queue"] = queue_position
+    
     if task["status"] == "completed":
         if "results" not in task:
             logger.error("Task marked as completed but no results found")
@@ -602,12 +1426,92 @@ def get_status(task_id):
     
     return jsonify(response), 200
 
+@app.route("/debug/llm_cache", methods=["GET"])
+def debug_llm_cache():
+    """Debug endpoint to check LLM response cache hits and misses."""
+    return jsonify(llm_cache.stats()), 200
+
+@app.route("/debug/chat_sessions", methods=["GET"])
+def debug_chat_sessions():
+    """Debug endpoint to check how many chat sessions are held in memory."""
+    return jsonify(conversation_chains.stats()), 200
+
+@app.route("/admin/cache/stats", methods=["GET"])
+def cache_stats():
+    """Get the size and entry count of the results cache."""
+    try:
+        return jsonify(result_cache.stats()), 200
+    except Exception as e:
+        logger.error(f"Error reading cache stats: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/cache/purge", methods=["POST"])
+def cache_purge():
+    """Remove one results cache entry by key, or every entry if no key is given."""
+    try:
+        data = request.get_json(silent=True) or {}
+        removed = result_cache.purge(data.get("key"))
+        return jsonify({"status": "success", "removed": removed}), 200
+    except Exception as e:
+        logger.error(f"Error purging cache: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/retry/<task_id>", methods=["POST"])
+def retry_task(task_id):
+    """Retry a failed task from its last completed stage."""
+    task = task_store.get(task_id)
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return jsonify({"error": "Task not found"}), 404
+    
+    if task["status"] != "error" or "pipeline" not in task:
+        logger.error(f"Cannot retry task in status: {task['status']}")
+        return jsonify({"error": f"Cannot retry task in status: {task['status']}"}), 400
+    
+    try:
+        task_store.update(task_id, {"status": "uploaded", "error": None, "cancel_requested": False})
+        submit_pipeline(task_id, task)
+    except QueueFullError as e:
+        task_store.update(task_id, {"status": "error"})
+        return queue_full_response(e)
+    except SourceUnavailable as e:
+        task_store.update(task_id, {"status": "error", "error": str(e)})
+        return jsonify({"error": str(e)}), 410
+    
+    return jsonify({
+        "message": "Task queued for retry",
+        "task_id": task_id,
+        "status": "uploaded",
+        "completed_stages": list(task.get("checkpoints", {}).keys())
+    }), 200
+
+@app.route("/cancel/<task_id>", methods=["POST"])
+def cancel_task(task_id):
+    """
+    Ask a task to stop.
+    
+    Audio extraction stops right away. Other stages stop at their next
+    boundary: before transcription, once the transcript is in, and before
+    each study artifact starts. Transcriptions and LLM calls already under
+    way finish first, and their results are kept for /retry.
+    """
+    task = task_store.get(task_id, fields=["status"])
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return jsonify({"error": "Task not found"}), 404
+    
+    if task["status"] in ("completed", "error"):
+        return jsonify({"error": f"Cannot cancel task in status: {task['status']}"}), 400
+    
+    task_store.update(task_id, {"cancel_requested": True})
+    return jsonify({"message": "Cancellation requested", "task_id": task_id}), 200
+
 @app.route("/debug/tasks", methods=["GET"])
 def debug_tasks():
     """Debug endpoint to check the current state of processing tasks."""
     # Create a simplified version of the tasks for debugging
     debug_tasks = {}
-    for task_id, task in processing_tasks.items():
+    for task_id, task in task_store.all().items():
         debug_tasks[task_id] = {
             "status": task["status"],
             "filename": task.get("filename", "unknown"),
@@ -619,15 +1523,206 @@ def debug_tasks():
     
     return jsonify(debug_tasks), 200
 
+@app.route("/debug/queue", methods=["GET"])
+def debug_queue():
+    """Debug endpoint to check worker pool usage, queue depth and pending transcriptions."""
+    return jsonify(dict(scheduler.stats(), stt=stt_poller.stats(), whisper=whisper_pool.stats())), 200
+
+def use_llm_cache():
+    """Whether the request allows cached LLM responses, opt out with ?cache=false."""
+    return request.args.get("cache", "true").lower() != "false"
+
+def sse_event(data, event=None):
+    """Format a Server-Sent Event carrying JSON data."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Stream an iterator of Server-Sent Events to the client."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/events/<task_id>", methods=["GET"])
+def task_events(task_id):
+    """
+    Push task progress over Server-Sent Events instead of /status polling.
+    
+    Emits "stage" events on status transitions, "progress" events as the current
+    stage advances, "queue" and "nodes" events when those change, and finally one
+    "result" or "error" event before the stream closes.
+    """
+    if task_store.get(task_id, fields=["status"]) is None:
+        logger.error(f"Task not found: {task_id}")
+        return jsonify({"error": "Task not found"}), 404
+    
+    # Poll only the small progress fields, results are read once at the end
+    progress_keys = ["status", "progress", "stage_progress", "nodes", "queue", "error"]
+    
+    def events():
+        # Ask the browser to reconnect quickly when EVENTS_MAX_SECONDS closes the stream
+        yield "retry: 2000\n\n"
+        last = {}
+        last_queue = None
+        started = last_sent = time.monotonic()
+        
+        while time.monotonic() - started < EVENTS_MAX_SECONDS:
+            task = task_store.get(task_id, fields=progress_keys)
+            if task is None:
+                yield sse_event({"error": "Task not found"}, event="error")
+                return
+            
+            progress = {
+                "status": task["status"],
+                "progress": task.get("progress", STAGE_PROGRESS.get(task["status"], (0, 0))[0]),
+                "stage_progress": task.get("stage_progress", 0)
+            }
+            if progress["status"] != last.get("status"):
+                yield sse_event(progress, event="stage")
+                last_sent = time.monotonic()
+            elif progress != {key: last.get(key) for key in progress}:
+                yield sse_event(progress, event="progress")
+                last_sent = time.monotonic()
+            
+            queue_position = live_queue_position(task)
+            if queue_position != last_queue:
+                yield sse_event(queue_position or {}, event="queue")
+                last_queue = queue_position
+                last_sent = time.monotonic()
+            
+            if task.get("nodes") and task["nodes"] != last.get("nodes"):
+                yield sse_event(task["nodes"], event="nodes")
+                last_sent = time.monotonic()
+            
+            last = dict(progress, nodes=task.get("nodes"))
+            
+            if task["status"] == "completed":
+                results = task_store.get(task_id, fields=["results"]).get("results")
+                yield sse_event(results, event="result")
+                return
+            if task["status"] == "error":
+                yield sse_event({"error": task.get("error", "Unknown error")}, event="error")
+                return
+            
+            if time.monotonic() - last_sent > EVENTS_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(EVENTS_POLL_SECONDS)
+    
+    return sse_response(events())
+
+@app.route("/stream/notes/<task_id>", methods=["GET"])
+def stream_notes_endpoint(task_id):
+    """
+    Stream notes for a task as markdown deltas over Server-Sent Events.
+    
+    The final `done` event carries the complete notes. For transcripts long
+    enough to be split into chunks they are stitched under one outline, so
+    clients should replace the streamed text with them.
+    """
+    task = task_store.get(task_id)
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return jsonify({"error": "Task not found"}), 404
+    
+    # Notes can stream as soon as the transcript stage has finished
+    results = task.get("results", {})
+    checkpoints = task.get("checkpoints", {})
+    transcript = results.get("transcript") or checkpoints.get("transcript")
+    if not transcript:
+        logger.error(f"No transcript found for task: {task_id}")
+        return jsonify({"error": "No transcript found for this task"}), 400
+    
+    existing_notes = results.get("notes") or checkpoints.get("notes")
+    summary = results.get("summary") or checkpoints.get("summary")
+    if not existing_notes and task.get("nodes", {}).get("notes") == "running":
+        # The study pack is generating the same notes, wait for its checkpoint
+        return jsonify({"error": "Notes are already being generated for this task"}), 409
+    
+    def events():
+        if existing_notes:
+            yield sse_event({"delta": existing_notes})
+            yield sse_event({"notes": existing_notes}, event="done")
+            return
+        
+        completed = {}
+        
+        def save_notes(notes):
+            completed["notes"] = notes
+            fields = {"checkpoints.notes": notes, "nodes.notes": "completed"}
+            if task_store.get(task_id).get("results"):
+                fields["results.notes"] = notes
+            task_store.update(task_id, fields)
+            # Chat retrieval must not keep answering from the previous notes
+            drop_index(task_id)
+        
+        try:
+            for delta in stream_notes(transcript["text"], summary=summary, on_complete=save_notes):
+                yield sse_event({"delta": delta})
+            yield sse_event({"notes": completed["notes"]}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming notes: {str(e)}", exc_info=True)
+            yield sse_event({"error": f"Error generating notes: {str(e)}"}, event="error")
+    
+    return sse_response(events())
+
+def load_word_transcript(task_id):
+    """
+    Load the word-level transcript of a task.
+    
+    Returns:
+        tuple: (WordTranscript, None) or (None, error response)
+    """
+    task = task_store.get(task_id, fields=["results", "checkpoints"])
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return None, (jsonify({"error": "Task not found"}), 404)
+    
+    transcript = task.get("results", {}).get("transcript") or task.get("checkpoints", {}).get("transcript")
+    if not transcript:
+        return None, (jsonify({"error": "No transcript found for this task"}), 400)
+    
+    word_transcript = WordTranscript.from_transcript(transcript)
+    if word_transcript is None:
+        return None, (jsonify({"error": "No word timings for this transcript"}), 400)
+    return word_transcript, None
+
+@app.route("/transcript/<task_id>/at", methods=["GET"])
+def transcript_at(task_id):
+    """Get the transcript text spoken from ?t= seconds, for the next ?window= seconds."""
+    try:
+        seconds = float(request.args.get("t", 0))
+        window = float(request.args.get("window", 10))
+    except ValueError:
+        return jsonify({"error": "t and window must be numbers"}), 400
+    
+    word_transcript, error = load_word_transcript(task_id)
+    if error:
+        return error
+    return jsonify({"status": "success", "segment": word_transcript.text_at(seconds, window)}), 200
+
+@app.route("/transcript/<task_id>/find", methods=["GET"])
+def transcript_find(task_id):
+    """Find the times at which the ?q= phrase is spoken."""
+    phrase = request.args.get("q", "").strip()
+    if not phrase:
+        return jsonify({"error": "No phrase provided"}), 400
+    
+    word_transcript, error = load_word_transcript(task_id)
+    if error:
+        return error
+    return jsonify({"status": "success", "matches": word_transcript.find(phrase)}), 200
+
 @app.route("/generate_flashcards/<task_id>", methods=["POST"])
 def generate_flashcards_endpoint(task_id):
     """Generate flashcards for a specific task on demand."""
-    if task_id not in processing_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         logger.error(f"Task not found: {task_id}")
         return jsonify({"error": "Task not found"}), 404
     
-    task = processing_tasks[task_id]
-    
     # Check if the task is completed
     if task["status"] != "completed":
         logger.error(f"Cannot generate flashcards for task in status: {task['status']}")
@@ -643,16 +1738,16 @@ def generate_flashcards_endpoint(task_id):
         transcript_text = task["results"]["transcript"]["text"]
         
         # Generate flashcards
-        flashcards = generate_flashcards(transcript_text)
+        flashcards = generate_flashcards(transcript_text, use_cache=use_llm_cache())
         
         # Update the task results with the new flashcards
         if "results" in task:
             task["results"]["flashcards"] = flashcards
+            task_store.update(task_id, {"results.flashcards": flashcards})
             
             # If this was a cached result, update the cache file
             if task.get("cached", False):
-                video_name = task["filename"]
-                save_to_cache(video_name, task["results"])
+                save_to_cache(task["cache_key"], task["results"])
         
         return jsonify({
             "status": "success",
@@ -666,12 +1761,11 @@ def generate_flashcards_endpoint(task_id):
 @app.route("/generate_mindmap/<task_id>", methods=["POST"])
 def generate_mindmap_endpoint(task_id):
     """Generate a mind map for a specific task on demand."""
-    if task_id not in processing_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         logger.error(f"Task not found: {task_id}")
         return jsonify({"error": "Task not found"}), 404
     
-    task = processing_tasks[task_id]
-    
     # Check if the task is completed
     if task["status"] != "completed":
         logger.error(f"Cannot generate mind map for task in status: {task['status']}")
@@ -687,16 +1781,16 @@ def generate_mindmap_endpoint(task_id):
         transcript_text = task["results"]["transcript"]["text"]
         
         # Generate mind map
-        mindmap = generate_mindmap(transcript_text)
+        mindmap = generate_mindmap(transcript_text, use_cache=use_llm_cache())
         
         # Update the task results with the new mind map
         if "results" in task:
             task["results"]["mindmap"] = mindmap
+            task_store.update(task_id, {"results.mindmap": mindmap})
             
             # If this was a cached result, update the cache file
             if task.get("cached", False):
-                video_name = task["filename"]
-                save_to_cache(video_name, task["results"])
+                save_to_cache(task["cache_key"], task["results"])
         
         return jsonify({
             "status": "success",
@@ -714,24 +1808,25 @@ def generate_quiz_endpoint(task_id):
     """
     try:
         # Check if task exists
-        if task_id not in processing_tasks:
+        task = task_store.get(task_id)
+        if task is None:
             return jsonify({"error": "Task not found"}), 404
         
         # Check if task is completed
-        if processing_tasks[task_id]["status"] != "completed":
+        if task["status"] != "completed":
             return jsonify({"error": "Task not completed yet"}), 400
         
         # Get the transcript
-        transcript = processing_tasks[task_id]["results"].get("transcript", {}).get("text", "")
+        transcript = task["results"].get("transcript", {}).get("text", "")
         
         if not transcript:
             return jsonify({"error": "No transcript available"}), 400
         
         # Generate quiz questions
-        quiz_questions = generate_quiz(transcript)
+        quiz_questions = generate_quiz(transcript, use_cache=use_llm_cache())
         
         # Update the task results
-        processing_tasks[task_id]["results"]["quiz"] = quiz_questions
+        task_store.update(task_id, {"results.quiz": quiz_questions})
         
         return jsonify({
             "status": "success",
@@ -873,12 +1968,11 @@ def add_flashcard(metadata_id):
 @app.route("/chat/<task_id>", methods=["POST"])
 def chat_endpoint(task_id):
     """Handle chat questions using LangChain conversation with context."""
-    if task_id not in processing_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         logger.error(f"Task not found: {task_id}")
         return jsonify({"error": "Task not found"}), 404
     
-    task = processing_tasks[task_id]
-    
     # Check if the task is completed
     if task["status"] != "completed":
         logger.error(f"Cannot chat with task in status: {task['status']}")
@@ -901,8 +1995,10 @@ def chat_endpoint(task_id):
         # Use the generated notes as context
         context = task["results"]["notes"]
         
+        transcript = task["results"].get("transcript", {}).get("text", "")
+        
         # Generate response using LangChain
-        response = chat_with_context(task_id, context, question)
+        response = chat_with_context(task_id, context, question, transcript)
         
         return jsonify({
             "status": "success",
@@ -913,11 +2009,53 @@ def chat_endpoint(task_id):
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         return jsonify({"error": f"Error in chat endpoint: {str(e)}"}), 500
 
+@app.route("/chat/<task_id>/stream", methods=["POST"])
+def stream_chat_endpoint(task_id):
+    """Stream a chat answer as text deltas over Server-Sent Events."""
+    task = task_store.get(task_id)
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return jsonify({"error": "Task not found"}), 404
+    
+    # Check if the task is completed
+    if task["status"] != "completed":
+        logger.error(f"Cannot chat with task in status: {task['status']}")
+        return jsonify({"error": f"Cannot chat with task in status: {task['status']}"}), 400
+    
+    # Check if we have the necessary data
+    if "results" not in task or "notes" not in task["results"]:
+        logger.error(f"No notes found for task: {task_id}")
+        return jsonify({"error": "No notes found for this task"}), 400
+    
+    data = request.get_json(silent=True)
+    if not data or "question" not in data:
+        logger.error("No question provided in request")
+        return jsonify({"error": "No question provided"}), 400
+    
+    question = data["question"]
+    context = task["results"]["notes"]
+    transcript = task["results"].get("transcript", {}).get("text", "")
+    
+    def events():
+        parts = []
+        try:
+            for delta in stream_chat(task_id, context, question, transcript):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            yield sse_event({"response": "".join(parts)}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}", exc_info=True)
+            yield sse_event({"error": f"Error generating response: {str(e)}"}, event="error")
+    
+    return sse_response(events())
+
 @app.route("/chat/<task_id>/clear", methods=["POST"])
 def clear_chat_endpoint(task_id):
     """Clear the conversation history for a specific task."""
     try:
         clear_conversation(task_id)
+        # Start a new metadata document so cleared turns are not rehydrated
+        task_store.update(task_id, {"chat_metadata_id": None})
         return jsonify({
             "status": "success",
             "message": "Conversation history cleared"
@@ -941,35 +2079,26 @@ def process_youtube():
         task_id = str(uuid.uuid4())
         
         # Check if this URL is already in the cache
-        cached_results = get_cached_results(url)
+        cache_key = get_url_hash(url)
+        cached_results = get_cached_results(cache_key)
         if cached_results:
-            # Initialize task status with cached results
-            processing_tasks[task_id] = {
-                "status": "completed",
-                "url": url,
-                "results": cached_results,
-                "cached": True
-            }
-            
-            return jsonify({
-                "message": "URL found in cache",
-                "task_id": task_id,
-                "status": "completed",
-                "cached": True
-            }), 200
+            return start_cached_task(task_id, cache_key, cached_results, message="URL found in cache", url=url)
 
         # Initialize task status
-        processing_tasks[task_id] = {
+        task = {
             "status": "uploaded",
-            "url": url
+            "url": url,
+            "cache_key": cache_key,
+            "pipeline": "youtube"
         }
+        task_store.create(task_id, task)
         
-        # Start processing in background thread
-        thread = threading.Thread(
-            target=process_youtube_video,
-            args=(task_id, url)
-        )
-        thread.start()
+        # Queue processing
+        try:
+            submit_pipeline(task_id, task)
+        except QueueFullError as e:
+            task_store.delete(task_id)
+            return queue_full_response(e)
         
         return jsonify({
             "message": "YouTube video processing started",
@@ -995,6 +2124,47 @@ def get_history():
         logger.error(f"Error fetching history: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/search', methods=['GET'])
+def search_history():
+    """Semantic search over the notes and transcripts of every processed task."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    
+    try:
+        k = int(request.args.get("k", SEARCH_TOP_K))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    if k <= 0:
+        return jsonify({"error": "k must be positive"}), 400
+    k = min(k, SEARCH_MAX_K)
+    
+    try:
+        started = time.time()
+        results = search_index.search(query, k)
+        return jsonify({
+            "query": query,
+            "results": results,
+            "took_ms": round((time.time() - started) * 1000, 1)
+        }), 200
+    except Exception as e:
+        logger.error(f"Error searching history: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Error searching history: {str(e)}"}), 500
+
+@app.route('/admin/search/reindex', methods=['POST'])
+def reindex_search():
+    """Add history items processed before the search index existed."""
+    try:
+        added = 0
+        for item in mongo.db.processing_history.find({}, {'_id': 0, 'task_id': 1, 'file_info': 1, 'results': 1}):
+            if not search_index.contains(item['task_id']):
+                add_to_search_index(item['task_id'], item.get('file_info', {}), item.get('results', {}))
+                added += 1
+        return jsonify({"status": "success", "tasks_added": added, "index": search_index.stats()}), 200
+    except Exception as e:
+        logger.error(f"Error reindexing search: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Error reindexing search: {str(e)}"}), 500
+
 @app.route('/history/<task_id>', methods=['GET'])
 def get_history_item(task_id):
     try:
@@ -1025,5 +2195,9 @@ def get_history_item(task_id):
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
+    # Only safe when a single server process owns the task store. The debug
+    # reloader runs this block twice, so resume in the child that serves requests.
+    if os.environ.get("RESUME_INTERRUPTED_TASKS", "false").lower() == "true" and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        resume_interrupted_tasks()
     logger.info(f"🚀 Server running on http://127.0.0.1:{PORT}")
     app.run(host="0.0.0.0", port=PORT, debug=True)
@@ -0,0 +1,195 @@
+"""
+Async serving mode for the endpoints that mostly wait on Gemini.
+
+/chat/<task_id> and the /generate_* endpoints are served by async handlers
+that await Gemini and LangChain, so thousands of in-flight LLM requests share
+one event loop instead of holding a thread each. Every other route falls
+through to the Flask app unchanged, keeping the URL contract of app.py.
+
+Flask routes run on a thread pool of ASGI_WSGI_WORKERS threads. Server-Sent
+Events routes (/events, /stream/notes, /chat/<task_id>/stream) and
+/upload/stream hold a thread for as long as the client stays connected, so
+the pool must be larger than the number of open streams expected per process.
+
+Run with:
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5001
+"""
+import os
+import asyncio
+import logging
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Match, Route
+from app import app as flask_app, task_store, save_to_cache
+from gemini_integration import agenerate_flashcards, agenerate_mindmap, agenerate_quiz
+from chat_integration import achat_with_context
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads serving Flask routes; each open event stream or streaming upload holds one
+ASGI_WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", 64))
+
+
+def use_llm_cache(request):
+    """Whether the request allows cached LLM responses, opt out with ?cache=false."""
+    return request.query_params.get("cache", "true").lower() != "false"
+
+
+async def get_task(task_id):
+    """Read a task without blocking the event loop on the task store."""
+    return await asyncio.to_thread(task_store.get, task_id)
+
+
+async def generate_artifact(request, key, label, agenerate):
+    """
+    Generate a study artifact for a completed task, as the Flask endpoints do.
+
+    Args:
+        request: The incoming request
+        key (str): Results field the artifact is stored under
+        label (str): Human readable artifact name used in errors
+        agenerate (callable): Async generator function taking the transcript text
+    """
+    task_id = request.path_params["task_id"]
+    task = await get_task(task_id)
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return JSONResponse({"error": "Task not found"}, status_code=404)
+
+    # Check if the task is completed
+    if task["status"] != "completed":
+        logger.error(f"Cannot generate {label} for task in status: {task['status']}")
+        return JSONResponse({"error": f"Cannot generate {label} for task in status: {task['status']}"}, status_code=400)
+
+    # Check if we have the transcript
+    if "results" not in task or "transcript" not in task["results"]:
+        logger.error(f"No transcript found for task: {task_id}")
+        return JSONResponse({"error": "No transcript found for this task"}, status_code=400)
+
+    try:
+        artifact = await agenerate(task["results"]["transcript"]["text"], use_cache=use_llm_cache(request))
+
+        # Update the task results with the new artifact
+        task["results"][key] = artifact
+        await asyncio.to_thread(task_store.update, task_id, {f"results.{key}": artifact})
+
+        # If this was a cached result, update the cache file
+        if task.get("cached", False):
+            await asyncio.to_thread(save_to_cache, task["cache_key"], task["results"])
+
+        return JSONResponse({"status": "success", key: artifact})
+
+    except Exception as e:
+        logger.error(f"Error generating {label}: {str(e)}", exc_info=True)
+        return JSONResponse({"error": f"Error generating {label}: {str(e)}"}, status_code=500)
+
+
+async def generate_flashcards_endpoint(request):
+    """Generate flashcards for a specific task on demand."""
+    return await generate_artifact(request, "flashcards", "flashcards", agenerate_flashcards)
+
+
+async def generate_mindmap_endpoint(request):
+    """Generate a mind map for a specific task on demand."""
+    return await generate_artifact(request, "mindmap", "mind map", agenerate_mindmap)
+
+
+async def generate_quiz_endpoint(request):
+    """Generate quiz questions based on the transcript."""
+    try:
+        task_id = request.path_params["task_id"]
+        task = await get_task(task_id)
+        if task is None:
+            return JSONResponse({"error": "Task not found"}, status_code=404)
+
+        # Check if task is completed
+        if task["status"] != "completed":
+            return JSONResponse({"error": "Task not completed yet"}, status_code=400)
+
+        # Get the transcript
+        transcript = task["results"].get("transcript", {}).get("text", "")
+        if not transcript:
+            return JSONResponse({"error": "No transcript available"}, status_code=400)
+
+        quiz_questions = await agenerate_quiz(transcript, use_cache=use_llm_cache(request))
+
+        # Update the task results
+        await asyncio.to_thread(task_store.update, task_id, {"results.quiz": quiz_questions})
+
+        return JSONResponse({"status": "success", "quiz": quiz_questions})
+
+    except Exception as e:
+        logger.error(f"Error generating quiz: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def chat_endpoint(request):
+    """Handle chat questions using LangChain conversation with context."""
+    task_id = request.path_params["task_id"]
+    task = await get_task(task_id)
+    if task is None:
+        logger.error(f"Task not found: {task_id}")
+        return JSONResponse({"error": "Task not found"}, status_code=404)
+
+    # Check if the task is completed
+    if task["status"] != "completed":
+        logger.error(f"Cannot chat with task in status: {task['status']}")
+        return JSONResponse({"error": f"Cannot chat with task in status: {task['status']}"}, status_code=400)
+
+    # Check if we have the necessary data
+    if "results" not in task or "notes" not in task["results"]:
+        logger.error(f"No notes found for task: {task_id}")
+        return JSONResponse({"error": "No notes found for this task"}, status_code=400)
+
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or "question" not in data:
+            logger.error("No question provided in request")
+            return JSONResponse({"error": "No question provided"}, status_code=400)
+
+        # Use the generated notes as context
+        transcript = task["results"].get("transcript", {}).get("text", "")
+        response = await achat_with_context(task_id, task["results"]["notes"], data["question"], transcript)
+
+        return JSONResponse({"status": "success", "response": response})
+
+    except Exception as e:
+        logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
+        return JSONResponse({"error": f"Error in chat endpoint: {str(e)}"}, status_code=500)
+
+
+ASYNC_ROUTES = [
+    Route("/chat/{task_id}", chat_endpoint, methods=["POST"]),
+    Route("/generate_flashcards/{task_id}", generate_flashcards_endpoint, methods=["POST"]),
+    Route("/generate_mindmap/{task_id}", generate_mindmap_endpoint, methods=["POST"]),
+    Route("/generate_quiz/{task_id}", generate_quiz_endpoint, methods=["POST"])
+]
+
+# Flask-CORS already covers the Flask routes, so CORS is only added for the async ones
+async_app = Starlette(
+    routes=ASYNC_ROUTES,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+)
+wsgi_app = WSGIMiddleware(flask_app, workers=ASGI_WSGI_WORKERS)
+
+
+async def application(scope, receive, send):
+    """Send async routes (and their CORS preflights) to Starlette, everything else to Flask."""
+    if scope["type"] == "http":
+        for route in ASYNC_ROUTES:
+            match, _ = route.matches(scope)
+            # A partial match is the right path with another method, e.g. OPTIONS
+            if match != Match.NONE:
+                await async_app(scope, receive, send)
+                return
+        await wsgi_app(scope, receive, send)
+        return
+    await async_app(scope, receive, send)
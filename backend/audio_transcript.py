@@ -1,13 +1,86 @@
-import whisper
+import os
 import json
+import logging
+import threading
+from contextlib import contextmanager
 
-model = whisper.load_model("base")
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Whisper model used for local transcription
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+
+# Maximum Whisper models loaded at once; each transcription holds one while it runs
+WHISPER_POOL_SIZE = int(os.environ.get("WHISPER_POOL_SIZE", 1))
+
+
+class WhisperModelPool:
+    """
+    Bounded pool of loaded Whisper models.
+
+    Models are loaded on first use rather than at import, and at most
+    max_models exist at once. A transcription borrows a model for its
+    duration; when every model is busy and the pool is full, it waits for
+    one to be returned.
+    """
+
+    def __init__(self, model_name, max_models):
+        self.model_name = model_name
+        self.max_models = max_models
+        self._idle = []
+        self._created = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def model(self):
+        """Borrow a model, loading a new one if the pool is not full yet."""
+        with self._condition:
+            while not self._idle and self._created >= self.max_models:
+                self._condition.wait()
+            if self._idle:
+                model = self._idle.pop()
+            else:
+                self._created += 1
+                model = None
+
+        if model is None:
+            try:
+                # Imported here so deployments using Google Speech never load torch
+                import whisper
+                logger.info(f"Loading Whisper model: {self.model_name}")
+                model = whisper.load_model(self.model_name)
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+
+        try:
+            yield model
+        finally:
+            with self._condition:
+                self._idle.append(model)
+                self._condition.notify()
+
+    def stats(self):
+        """Get the number of loaded and idle models."""
+        with self._condition:
+            return {"model": self.model_name, "loaded": self._created, "idle": len(self._idle), "max": self.max_models}
+
+
+model_pool = WhisperModelPool(WHISPER_MODEL, WHISPER_POOL_SIZE)
+
+
+def transcribe_audio(audio_path, **options):
+    """Transcribe audio with a pooled Whisper model, returning Whisper's raw result."""
+    with model_pool.model() as model:
+        # FP16 is only supported on GPUs
+        return model.transcribe(audio_path, fp16=False, **options)
 
-def transcribe_audio(audio_path):
-    return model.transcribe(audio_path)
 
 def transcribe_audio_timestamped(audio_path):
-    result = model.transcribe(audio_path, word_timestamps=True)
+    result = transcribe_audio(audio_path, word_timestamps=True)
 
     sentence_timestamps = []
 
@@ -0,0 +1,54 @@
+"""
+Compare the moviepy and ffmpeg audio extraction paths on one video.
+
+Usage:
+    python benchmark_audio_extraction.py lecture.mp4
+
+Reports wall time, CPU time of the process and its ffmpeg children, and the
+size of each output. Use a long recording (e.g. a one-hour lecture) for
+representative numbers.
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+from media_tools import probe_duration
+from video_to_audio import convert_video_to_audio, extract_audio
+
+
+def cpu_seconds():
+    """CPU time used so far by this process and its finished children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def measure(name, fn, video_path, audio_output):
+    wall_start = time.time()
+    cpu_start = cpu_seconds()
+    fn(video_path, audio_output)
+    wall = time.time() - wall_start
+    cpu = cpu_seconds() - cpu_start
+    size = os.path.getsize(audio_output) / (1024 * 1024)
+    print(f"{name:<8} wall {wall:8.1f}s   cpu {cpu:8.1f}s   output {size:8.1f} MB")
+    return wall
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+
+    video_path = sys.argv[1]
+    print(f"Input: {video_path} ({probe_duration(video_path) / 60:.1f} minutes)")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        moviepy_wall = measure("moviepy", convert_video_to_audio, video_path, os.path.join(output_dir, "audio.mp3"))
+        ffmpeg_wall = measure("ffmpeg", extract_audio, video_path, os.path.join(output_dir, "audio.flac"))
+
+    print(f"ffmpeg is {moviepy_wall / ffmpeg_wall:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
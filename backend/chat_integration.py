@@ -1,35 +1,243 @@
 import os
+import time
+import asyncio
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
+import threading
+from collections import OrderedDict
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.chains import ConversationChain, LLMChain
 from langchain.prompts import PromptTemplate
+from clients import get_chat_model
+from retrieval import retrieve
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure the Gemini API
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Limits on the conversation chains kept in memory
+CHAT_MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", 200))
+CHAT_SESSION_TTL_SECONDS = int(os.environ.get("CHAT_SESSION_TTL_SECONDS", 3600))
+CHAT_CACHE_MAX_CHARS = int(os.environ.get("CHAT_CACHE_MAX_CHARS", 50 * 1024 * 1024))
+
+# Token budget of the recent turns kept verbatim; older turns are folded into a running summary
+CHAT_MEMORY_TOKENS = int(os.environ.get("CHAT_MEMORY_TOKENS", 2000))
+
+# Number of persisted turns replayed into the memory of a rehydrated session
+CHAT_REHYDRATE_TURNS = int(os.environ.get("CHAT_REHYDRATE_TURNS", 50))
+
+
+class ConversationCache:
+    """
+    LRU cache of conversation chains bounded by session count, idle time and size.
+
+    The size of a session is estimated as the characters of its notes context
+    plus its conversation history. Sessions are evicted least recently used
+    first; the turns themselves are persisted elsewhere, so an evicted session
+    is rebuilt on its next message.
+    """
+
+    def __init__(self, max_sessions, ttl_seconds, max_chars):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_chars = max_chars
+        self._sessions = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, task_id):
+        conversation, size, _ = self._sessions.pop(task_id)
+        self._total_chars -= size
+
+    def get(self, task_id):
+        """Get the chain for a task, or None if it was never created, expired or evicted."""
+        with self._lock:
+            entry = self._sessions.get(task_id)
+            if entry is None:
+                return None
+            conversation, size, last_used = entry
+            if time.time() - last_used > self.ttl_seconds:
+                self._drop(task_id)
+                return None
+            self._sessions[task_id] = (conversation, size, time.time())
+            self._sessions.move_to_end(task_id)
+            return conversation
+
+    def put(self, task_id, conversation, size):
+        """Store or resize a chain, evicting the least recently used to stay in bounds."""
+        with self._lock:
+            if task_id in self._sessions:
+                self._drop(task_id)
+            self._sessions[task_id] = (conversation, size, time.time())
+            self._total_chars += size
+
+            now = time.time()
+            evicted = 0
+            for old_id in list(self._sessions):
+                over_budget = len(self._sessions) > self.max_sessions or self._total_chars > self.max_chars
+                expired = now - self._sessions[old_id][2] > self.ttl_seconds
+                if old_id == task_id or not (over_budget or expired):
+                    continue
+                self._drop(old_id)
+                evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} conversation sessions")
+
+    def pop(self, task_id):
+        """Remove a task's chain, returning whether one was cached."""
+        with self._lock:
+            if task_id not in self._sessions:
+                return False
+            self._drop(task_id)
+            return True
+
+    def stats(self):
+        """Get the number of cached sessions and their estimated size."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_chars": self._total_chars,
+                "max_sessions": self.max_sessions,
+                "max_chars": self.max_chars
+            }
+
 
 # Store conversation chains for different tasks
-conversation_chains = {}
+conversation_chains = ConversationCache(CHAT_MAX_SESSIONS, CHAT_SESSION_TTL_SECONDS, CHAT_CACHE_MAX_CHARS)
+
+# Callbacks that load and persist chat turns, set by the app with configure_persistence
+_load_history = None
+_save_turn = None
+
+
+def configure_persistence(load_history, save_turn):
+    """
+    Set how chat turns are persisted.
+    
+    Args:
+        load_history (callable): Takes a task ID, returns a list of {"question", "answer"} dicts
+        save_turn (callable): Takes a task ID, question and answer
+    """
+    global _load_history, _save_turn
+    _load_history = load_history
+    _save_turn = save_turn
+
+
+def estimate_tokens(messages):
+    """Approximate the tokens of chat messages at four characters per token."""
+    return sum(len(message.content) for message in messages) // 4
+
+
+class BudgetedSummaryMemory(ConversationSummaryBufferMemory):
+    """
+    Conversation memory with a fixed token budget.
+    
+    Recent turns are kept verbatim while they fit in max_token_limit. Once the
+    window overflows, the oldest turns are folded into the running summary
+    until the window is back to three quarters of the budget, so the summary
+    is only updated every few turns and the prompt size stays flat however
+    long the session runs. Tokens are estimated locally instead of asking the
+    model to count them.
+    """
+    
+    def _pop_overflow(self):
+        buffer = self.chat_memory.messages
+        if estimate_tokens(buffer) <= self.max_token_limit:
+            return []
+        pruned = []
+        while buffer and estimate_tokens(buffer) > self.max_token_limit * 0.75:
+            pruned.append(buffer.pop(0))
+        return pruned
+    
+    def prune(self):
+        """Fold the oldest turns into the summary if the window is over budget."""
+        pruned = self._pop_overflow()
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+    
+    async def aprune(self):
+        """Async version of prune."""
+        pruned = self._pop_overflow()
+        if pruned:
+            self.moving_summary_buffer = await self.apredict_new_summary(pruned, self.moving_summary_buffer)
+
+
+def create_memory():
+    """Create the token-budgeted memory of a chat session."""
+    return BudgetedSummaryMemory(
+        llm=get_chat_model(temperature=0.0),
+        max_token_limit=CHAT_MEMORY_TOKENS,
+        input_key="input"
+    )
+
+
+def session_size(context, memory):
+    """Estimate the characters held by a session's context, summary and recent turns."""
+    history = sum(len(message.content) for message in memory.chat_memory.messages)
+    return len(context) + len(memory.moving_summary_buffer) + history
+
+
+def rehydrate_memory(task_id, memory):
+    """Replay a task's persisted turns into a fresh memory."""
+    if _load_history is None:
+        return
+    try:
+        turns = _load_history(task_id)[-CHAT_REHYDRATE_TURNS:]
+    except Exception as e:
+        logger.error(f"Error loading chat history for task {task_id}: {str(e)}")
+        return
+    for turn in turns:
+        memory.chat_memory.add_user_message(turn["question"])
+        memory.chat_memory.add_ai_message(turn["answer"])
+    # Summarize the replayed turns that do not fit the budget in one call
+    memory.prune()
+    if turns:
+        logger.info(f"Rehydrated {len(turns)} chat turns for task {task_id}")
+
+
+# "retrieval" injects the notes and transcript chunks relevant to each question,
+# "full" puts the complete notes into every prompt
+CHAT_CONTEXT_MODE = os.environ.get("CHAT_CONTEXT_MODE", "retrieval")
+
+RETRIEVAL_TEMPLATE = """You are an AI assistant helping a student understand their study materials.
+    Use the following excerpts from their lecture notes and transcript to answer the question:
+    
+    {context}
+    
+    Current conversation:
+    {history}
+    Human: {input}
+    Assistant:"""
+
 
 def get_or_create_conversation_chain(task_id, context):
     """Get an existing conversation chain or create a new one for a task."""
-    if task_id in conversation_chains:
-        return conversation_chains[task_id]
+    conversation = conversation_chains.get(task_id)
+    if conversation is not None:
+        return conversation
     
     # Create a new conversation chain
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro",
-        google_api_key=GOOGLE_API_KEY,
-        temperature=0.7,
-        convert_system_message_to_human=True
-    )
+    llm = get_chat_model(temperature=0.7)
     
-    # Create a custom prompt template that includes the context
-    template = f"""You are an AI assistant helping a student understand their study materials.
+    # Create memory, restoring any turns persisted before the session was evicted
+    memory = create_memory()
+    rehydrate_memory(task_id, memory)
+    
+    if CHAT_CONTEXT_MODE == "retrieval":
+        # The context is filled in per turn with the retrieved chunks
+        prompt = PromptTemplate(
+            input_variables=["context", "history", "input"],
+            template=RETRIEVAL_TEMPLATE
+        )
+        conversation = LLMChain(
+            llm=llm,
+            memory=memory,
+            prompt=prompt,
+            verbose=True
+        )
+        held_context = ""
+    else:
+        # Create a custom prompt template that includes the context
+        template = f"""You are an AI assistant helping a student understand their study materials.
     Use the following lecture notes as context for the entire conversation:
     
     {context}
@@ -38,35 +246,76 @@ def get_or_create_conversation_chain(task_id, context):
     {{history}}
     Human: {{input}}
     Assistant:"""
-    
-    prompt = PromptTemplate(
-        input_variables=["history", "input"],
-        template=template
-    )
-    
-    # Create memory and conversation chain
-    memory = ConversationBufferMemory()
-    conversation = ConversationChain(
-        llm=llm,
-        memory=memory,
-        prompt=prompt,
-        verbose=True
-    )
+        
+        prompt = PromptTemplate(
+            input_variables=["history", "input"],
+            template=template
+        )
+        conversation = ConversationChain(
+            llm=llm,
+            memory=memory,
+            prompt=prompt,
+            verbose=True
+        )
+        held_context = context
     
     # Store the conversation chain
-    conversation_chains[task_id] = conversation
+    conversation_chains.put(task_id, conversation, session_size(held_context, memory))
     return conversation
 
-def chat_with_context(task_id, context, user_input):
-    """Generate a response using the conversation chain with context."""
+
+def build_turn_inputs(task_id, notes, transcript, user_input):
+    """
+    Build the chain inputs for a chat turn.
+    
+    Returns:
+        tuple: (inputs dict, context characters the session holds between turns)
+    """
+    if CHAT_CONTEXT_MODE != "retrieval":
+        return {"input": user_input}, notes
+    chunks = retrieve(task_id, notes, transcript, user_input)
+    return {"input": user_input, "context": "\n\n---\n\n".join(chunks)}, ""
+
+
+def estimate_prompt_tokens(conversation, inputs, held_context):
+    """Approximate the prompt tokens of a chat turn at four characters per token."""
+    prompt_chars = session_size(held_context, conversation.memory) + sum(len(value) for value in inputs.values())
+    return prompt_chars // 4
+
+
+def record_turn(task_id, context, conversation, user_input, response):
+    """Resize the cached session and persist the new turn."""
+    conversation_chains.put(task_id, conversation, session_size(context, conversation.memory))
+    if _save_turn is None:
+        return
+    try:
+        _save_turn(task_id, user_input, response)
+    except Exception as e:
+        logger.error(f"Error saving chat turn for task {task_id}: {str(e)}")
+
+def chat_with_context(task_id, context, user_input, transcript=""):
+    """
+    Generate a response using the conversation chain with context.
+    
+    Args:
+        task_id (str): ID of the task being discussed
+        context (str): Generated notes for the task
+        user_input (str): The student's question
+        transcript (str): Transcript text, searched alongside the notes in retrieval mode
+    """
     try:
         logger.info(f"Generating chat response for task {task_id}")
+        started = time.time()
         
         # Get or create conversation chain
         conversation = get_or_create_conversation_chain(task_id, context)
+        inputs, held_context = build_turn_inputs(task_id, context, transcript, user_input)
+        prompt_tokens = estimate_prompt_tokens(conversation, inputs, held_context)
         
         # Generate response
-        response = conversation.predict(input=user_input)
+        response = conversation.predict(**inputs)
+        logger.info(f"Chat turn for task {task_id} ({CHAT_CONTEXT_MODE}): ~{prompt_tokens} prompt tokens, {time.time() - started:.2f}s")
+        record_turn(task_id, held_context, conversation, user_input, response)
         
         return response
         
@@ -74,8 +323,76 @@ def chat_with_context(task_id, context, user_input):
         logger.error(f"Error in chat_with_context: {str(e)}", exc_info=True)
         return f"Error generating response: {str(e)}"
 
+async def achat_with_context(task_id, context, user_input, transcript=""):
+    """Async version of chat_with_context, awaiting the LLM instead of blocking a thread."""
+    try:
+        logger.info(f"Generating chat response for task {task_id}")
+        started = time.time()
+        
+        # Get or create conversation chain
+        # Rehydrating an evicted session reads Mongo and may summarize, keep it off the event loop
+        conversation = await asyncio.to_thread(get_or_create_conversation_chain, task_id, context)
+        # Embedding the question is CPU-bound, keep it off the event loop
+        inputs, held_context = await asyncio.to_thread(build_turn_inputs, task_id, context, transcript, user_input)
+        prompt_tokens = estimate_prompt_tokens(conversation, inputs, held_context)
+        
+        # Generate response
+        response = await conversation.apredict(**inputs)
+        logger.info(f"Chat turn for task {task_id} ({CHAT_CONTEXT_MODE}): ~{prompt_tokens} prompt tokens, {time.time() - started:.2f}s")
+        await asyncio.to_thread(record_turn, task_id, held_context, conversation, user_input, response)
+        
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error in achat_with_context: {str(e)}", exc_info=True)
+        return f"Error generating response: {str(e)}"
+
+def stream_chat(task_id, context, user_input, transcript=""):
+    """
+    Stream a chat response as text deltas while Gemini generates it.
+    
+    The completed answer is saved to the session memory and persisted once the
+    stream finishes, exactly as chat_with_context does for a whole answer.
+    
+    Args:
+        task_id (str): ID of the task being discussed
+        context (str): Generated notes for the task
+        user_input (str): The student's question
+        transcript (str): Transcript text, searched alongside the notes in retrieval mode
+        
+    Yields:
+        str: Pieces of the answer in order
+    """
+    logger.info(f"Streaming chat response for task {task_id}")
+    started = time.time()
+    
+    conversation = get_or_create_conversation_chain(task_id, context)
+    inputs, held_context = build_turn_inputs(task_id, context, transcript, user_input)
+    prompt_tokens = estimate_prompt_tokens(conversation, inputs, held_context)
+    
+    # Build the same prompt the chain would send, then stream it from the model directly
+    history = conversation.memory.load_memory_variables(inputs)["history"]
+    prompt = conversation.prompt.format(history=history, **inputs)
+    
+    parts = []
+    first_token = None
+    for chunk in conversation.llm.stream(prompt):
+        if not chunk.content:
+            continue
+        if first_token is None:
+            first_token = time.time() - started
+        parts.append(chunk.content)
+        yield chunk.content
+    
+    response = "".join(parts)
+    conversation.memory.save_context({"input": user_input}, {"output": response})
+    logger.info(
+        f"Streamed chat turn for task {task_id} ({CHAT_CONTEXT_MODE}): ~{prompt_tokens} prompt tokens, "
+        f"first token {first_token or 0:.2f}s, total {time.time() - started:.2f}s"
+    )
+    record_turn(task_id, held_context, conversation, user_input, response)
+
 def clear_conversation(task_id):
     """Clear the conversation history for a specific task."""
-    if task_id in conversation_chains:
-        del conversation_chains[task_id]
+    if conversation_chains.pop(task_id):
         logger.info(f"Cleared conversation for task {task_id}") 
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import json
+import logging
+import threading
+import grpc
+import requests
+import google.auth
+import google.generativeai as genai
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.cloud import speech
+from google.cloud import storage
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configure the Gemini API
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+genai.configure(api_key=GOOGLE_API_KEY)
+
+# Model used when a caller does not ask for a specific one
+DEFAULT_GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-pro")
+
+# Per-model generation settings, e.g. '{"gemini-1.5-flash": {"temperature": 0.2}}'
+GEMINI_MODEL_CONFIGS = json.loads(os.environ.get("GEMINI_MODEL_CONFIGS", "{}"))
+
+# SentenceTransformer used to embed text for retrieval
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Maximum pooled HTTP connections kept open to Cloud Storage
+GCS_POOL_SIZE = int(os.environ.get("GCS_POOL_SIZE", 32))
+
+# Seconds warm-up waits for the Speech-to-Text channel to connect
+WARM_UP_TIMEOUT_SECONDS = float(os.environ.get("WARM_UP_TIMEOUT_SECONDS", 10))
+
+# Clients are created once per process and shared by every thread
+_clients = {}
+# Reentrant because a client factory may create a shared dependency, e.g. credentials
+_lock = threading.RLock()
+
+
+def _get_or_create(key, factory):
+    """Return the client stored under key, creating it on first use."""
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        if key not in _clients:
+            logger.info(f"Creating client: {key}")
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_gemini_model(model_name=None):
+    """
+    Get the shared Gemini model client.
+
+    Args:
+        model_name (str): Gemini model name, defaults to GEMINI_MODEL
+
+    Returns:
+        genai.GenerativeModel: A model configured with its GEMINI_MODEL_CONFIGS entry
+    """
+    model_name = model_name or DEFAULT_GEMINI_MODEL
+    return _get_or_create(
+        ("gemini", model_name),
+        lambda: genai.GenerativeModel(model_name, generation_config=GEMINI_MODEL_CONFIGS.get(model_name))
+    )
+
+
+def get_chat_model(model_name=None, temperature=0.7):
+    """Get the shared LangChain chat model for a model name and temperature."""
+    model_name = model_name or DEFAULT_GEMINI_MODEL
+    return _get_or_create(
+        ("chat", model_name, temperature),
+        lambda: ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=GOOGLE_API_KEY,
+            temperature=temperature,
+            convert_system_message_to_human=True
+        )
+    )
+
+
+def _storage_credentials():
+    """Get the shared (credentials, project) pair used by the Cloud Storage client."""
+    return _get_or_create("storage_credentials", lambda: google.auth.default(scopes=storage.Client.SCOPE))
+
+
+def _create_storage_client():
+    credentials, project = _storage_credentials()
+    # Let concurrent uploads reuse connections instead of opening new ones
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_POOL_SIZE)
+    session.mount("https://", adapter)
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+
+def get_storage_client():
+    """Get the shared Cloud Storage client."""
+    return _get_or_create("storage", _create_storage_client)
+
+
+def get_speech_client():
+    """Get the shared Speech-to-Text client, whose gRPC channel is reused across jobs."""
+    return _get_or_create("speech", speech.SpeechClient)
+
+
+def _create_embedding_model():
+    # Imported here so processes that never embed text do not load torch
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def get_embedding_model():
+    """Get the shared SentenceTransformer, loading it on first use."""
+    return _get_or_create("embedding", _create_embedding_model)
+
+
+def _warm_storage():
+    # Fetch an access token now instead of on the first upload
+    get_storage_client()
+    credentials, _ = _storage_credentials()
+    credentials.refresh(Request())
+
+
+def _warm_speech():
+    # Connect the gRPC channel now instead of on the first recognition
+    client = get_speech_client()
+    grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=WARM_UP_TIMEOUT_SECONDS)
+
+
+def warm_up():
+    """
+    Create every client up front and make one cheap call through each, so the
+    first request does not pay for authentication and connection setup.
+    """
+    for name, warm in (
+        ("gemini", lambda: get_gemini_model().count_tokens("warm-up")),
+        ("chat", lambda: get_chat_model().get_num_tokens("warm-up")),
+        ("storage", _warm_storage),
+        ("speech", _warm_speech)
+    ):
+        try:
+            warm()
+        except Exception as e:
+            logger.error(f"Error warming up {name} client: {str(e)}")
+    logger.info("Client warm-up complete")
@@ -0,0 +1,151 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of graph nodes running at once across all tasks
+DAG_WORKERS = int(os.environ.get("DAG_WORKERS", 16))
+
+# Shared by every graph so concurrent tasks cannot multiply the number of graph nodes;
+# a node may still fan out further, e.g. gemini_integration.map_chunks runs the chunks
+# of a long transcript on up to GEMINI_MAP_WORKERS threads of its own
+_executor = ThreadPoolExecutor(max_workers=DAG_WORKERS, thread_name_prefix="dag")
+
+
+class Node:
+    """
+    A unit of work in a dependency graph.
+
+    Args:
+        name (str): Unique name of the node, also the key of its result
+        fn (callable): Called with a dict of dependency results, returns the node's result
+        deps (list): Names of nodes or initial inputs this node needs
+        required (bool): Whether a failure of this node fails the whole graph
+    """
+
+    def __init__(self, name, fn, deps=(), required=True):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.required = required
+
+
+class DagCancelled(Exception):
+    """Raised when a graph is stopped by its cancellation hook."""
+
+
+class DagError(Exception):
+    """Raised when a required node fails."""
+
+    def __init__(self, node, error):
+        super().__init__(f"Node {node} failed: {str(error)}")
+        self.node = node
+        self.error = error
+
+
+def run_dag(nodes, inputs, on_status=None, done=None, should_cancel=None):
+    """
+    Run nodes concurrently, starting each one as soon as its dependencies are met.
+
+    Args:
+        nodes (list): Node objects forming an acyclic graph
+        inputs (dict): Initial values available as dependencies, e.g. the transcript
+        on_status (callable): Called with (node name, status, result) whenever a node
+            is "running", "completed", "error" or "skipped"
+        done (dict): Results of nodes that already completed, these are not re-run
+        should_cancel (callable): Polled before starting nodes; returning True skips
+            every node not started yet, and the graph stops once running ones finish
+
+    Returns:
+        dict: Results of all completed nodes, keyed by node name
+
+    Raises:
+        DagCancelled: If should_cancel asked to stop
+        DagError: If a required node fails
+    """
+    on_status = on_status or (lambda name, status, result: None)
+    results = dict(inputs)
+    results.update(done or {})
+    pending = {node.name: node for node in nodes if node.name not in results}
+    failed = {}
+    lock = threading.Lock()
+    finished = threading.Condition(lock)
+    running = set()
+    cancelled = False
+
+    for node in nodes:
+        missing = [dep for dep in node.deps if dep not in results and dep not in pending]
+        if missing:
+            raise ValueError(f"Node {node.name} depends on unknown nodes: {missing}")
+    for name in (done or {}):
+        on_status(name, "completed", results[name])
+
+    def notify(name, status, result):
+        # A failing status hook (e.g. a task store error) must not stall the graph
+        try:
+            on_status(name, status, result)
+        except Exception as e:
+            logger.error(f"Status callback for DAG node {name} failed: {str(e)}", exc_info=True)
+
+    def run_node(node, args):
+        status, result = "error", None
+        try:
+            try:
+                result = node.fn(args)
+                status = "completed"
+            except Exception as e:
+                logger.error(f"DAG node {node.name} failed: {str(e)}", exc_info=True)
+                result = e
+            # Reported before the node is recorded, so no status lands after the graph returns
+            notify(node.name, status, result if status == "completed" else str(result))
+        finally:
+            # Always release the waiting graph, whatever the node or its status hook did
+            with lock:
+                if status == "completed":
+                    results[node.name] = result
+                else:
+                    failed[node.name] = result
+                running.discard(node.name)
+                finished.notify_all()
+
+    with lock:
+        while pending or running:
+            # Running nodes cannot be interrupted, but nothing new starts after a cancel
+            if pending and should_cancel and should_cancel():
+                cancelled = True
+                for name in list(pending):
+                    del pending[name]
+                    notify(name, "skipped", None)
+
+            # Nodes downstream of a failure can never run
+            for name, node in list(pending.items()):
+                if any(dep in failed for dep in node.deps):
+                    del pending[name]
+                    failed[name] = DagError(name, "dependency failed")
+                    notify(name, "skipped", None)
+
+            for name, node in list(pending.items()):
+                if all(dep in results for dep in node.deps):
+                    del pending[name]
+                    running.add(name)
+                    notify(name, "running", None)
+                    args = {dep: results[dep] for dep in node.deps}
+                    _executor.submit(run_node, node, args)
+
+            if running:
+                finished.wait()
+            elif pending:
+                raise ValueError(f"Nodes can never run: {list(pending)}")
+
+    if cancelled:
+        raise DagCancelled("Graph cancelled before all nodes ran")
+
+    for node in nodes:
+        if node.required and node.name in failed:
+            raise DagError(node.name, failed[node.name])
+
+    return {name: value for name, value in results.items() if name not in inputs}
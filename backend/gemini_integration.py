@@ -1,33 +1,155 @@
-import google.generativeai as genai
 import os
+import re
 import logging
 import json
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from clients import get_gemini_model, DEFAULT_GEMINI_MODEL, GEMINI_MODEL_CONFIGS
+from llm_cache import llm_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure the Gemini API
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+# Texts longer than this many characters are processed chunk by chunk (map-reduce)
+GEMINI_CHUNK_CHARS = int(os.environ.get("GEMINI_CHUNK_CHARS", 40000))
 
-def generate_notes(transcript_text):
+# Maximum number of chunk-level Gemini calls running at once for one text
+GEMINI_MAP_WORKERS = int(os.environ.get("GEMINI_MAP_WORKERS", 4))
+
+# Sentence ends: Latin punctuation followed by whitespace, or CJK full stops
+# and marks, which are usually followed directly by the next sentence
+CJK_SENTENCE_ENDS = ("。", "！", "？")
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|(?<=[。！？])\s*')
+
+def split_text(text, max_chars=None):
     """
-    Generate detailed lecture notes using Google's Gemini model.
+    Split text into chunks on section or sentence boundaries.
+    
+    Paragraphs (blank-line separated sections, e.g. PDF pages) are packed into
+    chunks of at most max_chars. Paragraphs that are too long on their own are
+    split on sentence ends, sentences that are still too long on words, and
+    words longer than max_chars by character count.
     
     Args:
-        transcript_text (str): The transcript text to generate notes from
+        text (str): The text to split
+        max_chars (int): Maximum chunk length, defaults to GEMINI_CHUNK_CHARS
         
     Returns:
-        str: Generated notes in markdown format
+        list: Chunks of text in their original order
     """
-    try:
-        # Initialize the model - using gemini-1.5-pro which is the latest supported model
-        logger.info("Initializing Gemini model")
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Create the prompt
-        prompt = f"""You are an AI that generates detailed, structured, and accurate lecture notes from transcriptions. 
+    max_chars = max_chars or GEMINI_CHUNK_CHARS
+    if len(text) <= max_chars:
+        return [text]
+    
+    pieces = []
+    for section in re.split(r'\n\s*\n', text):
+        if len(section) <= max_chars:
+            pieces.append((section, "\n\n"))
+            continue
+        separator = " "
+        for sentence in SENTENCE_END.split(section):
+            # CJK sentences are not separated by spaces, so they rejoin without one
+            next_separator = "" if sentence.endswith(CJK_SENTENCE_ENDS) else " "
+            if len(sentence) <= max_chars:
+                pieces.append((sentence, separator))
+                separator = next_separator
+                continue
+            # Unpunctuated transcripts fall back to word boundaries
+            words = sentence.split(" ")
+            current = []
+            length = 0
+            for word in words:
+                if current and length + len(word) + 1 > max_chars:
+                    pieces.append((" ".join(current), separator))
+                    separator = " "
+                    current = []
+                    length = 0
+                # Words longer than a chunk (e.g. unspaced CJK text) are cut by character count
+                while len(word) > max_chars:
+                    pieces.append((word[:max_chars], separator))
+                    separator = ""
+                    word = word[max_chars:]
+                if word:
+                    current.append(word)
+                    length += len(word) + 1
+            if current:
+                pieces.append((" ".join(current), separator))
+            separator = next_separator
+    
+    chunks = []
+    current = ""
+    for piece, separator in pieces:
+        if not piece.strip():
+            continue
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    
+    logger.info(f"Split {len(text)} characters into {len(chunks)} chunks")
+    return chunks
+
+def map_chunks(fn, chunks):
+    """Run fn on every chunk concurrently, returning results in chunk order"""
+    if len(chunks) == 1:
+        return [fn(chunks[0])]
+    with ThreadPoolExecutor(max_workers=GEMINI_MAP_WORKERS) as executor:
+        return list(executor.map(fn, chunks))
+
+def _normalize_question(question):
+    """Normalize a question for duplicate detection"""
+    return re.sub(r'[^a-z0-9]+', ' ', str(question).lower()).strip()
+
+def _dedupe_by_question(items):
+    """Drop items whose question duplicates an earlier one"""
+    seen = set()
+    unique = []
+    for item in items:
+        if not isinstance(item, dict) or "question" not in item:
+            continue
+        key = _normalize_question(item["question"])
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(item)
+    return unique
+
+def _combine_questions(chunk_items):
+    """Flatten per-chunk flashcards or quiz questions, dropping repeated questions"""
+    if len(chunk_items) == 1:
+        return chunk_items[0]
+    return _dedupe_by_question([item for items in chunk_items for item in items])
+
+def _generate_text(prompt, model_name=None, use_cache=True):
+    """
+    Send a prompt to Gemini and return the response text.
+    
+    Identical calls (same model, prompt and generation parameters) are served
+    from the response cache unless use_cache is False.
+    """
+    model_name = model_name or DEFAULT_GEMINI_MODEL
+    params = GEMINI_MODEL_CONFIGS.get(model_name)
+    if use_cache:
+        cached = llm_cache.get(model_name, prompt, params)
+        if cached is not None:
+            logger.info("Serving Gemini response from cache")
+            return cached
+    
+    model = get_gemini_model(model_name)
+    response = model.generate_content(prompt)
+    logger.info("Received response from Gemini")
+    
+    # Responses are still cached when a caller opts out of reading the cache
+    llm_cache.put(model_name, prompt, response.text, params)
+    return response.text
+
+def _notes_prompt(transcript_text):
+    """Build the lecture notes prompt"""
+    return f"""You are an AI that generates detailed, structured, and accurate lecture notes from transcriptions. 
         Minimum 2-3 page response is required. The format must be markdown that can be embedded into a website. 
         Add proper line breaks and bullet points for lists, subtopics, and lines to look it good. 
         You may add information that is not present in the transcription, but ensure it is relevant and accurate.
@@ -44,34 +166,204 @@ def generate_notes(transcript_text):
         - If possible, highlight any key takeaways or important conclusions
         - Maintain the authenticity of the information provided in the transcription
         """
+
+def _stitch_notes(chunk_notes):
+    """
+    Combine the notes generated for each chunk under one outline.
+    
+    Each chunk becomes a numbered part titled by its first heading. Headings
+    inside a part are demoted two levels so they nest below the part heading.
+    """
+    outline = []
+    sections = []
+    for index, notes in enumerate(chunk_notes, 1):
+        headings = [line.lstrip('#').strip() for line in notes.splitlines() if re.match(r'^#{1,2}\s', line)]
+        title = f"Part {index}: {headings[0]}" if headings else f"Part {index}"
+        outline.append(f"{index}. {title}")
+        for heading in headings[1:]:
+            outline.append(f"    - {heading}")
+        demoted = re.sub(r'^(#{1,4})(?=\s)', r'##\1', notes, flags=re.MULTILINE)
+        sections.append(f"## {title}\n\n{demoted.strip()}")
+    
+    return "# Lecture Notes\n\n## Outline\n\n" + "\n".join(outline) + "\n\n---\n\n" + "\n\n---\n\n".join(sections)
+
+def generate_notes(transcript_text, summary=None, use_cache=True):
+    """
+    Generate detailed lecture notes using Google's Gemini model.
+    
+    Long transcripts are split into chunks whose notes are generated
+    concurrently and stitched under one outline.
+    
+    Args:
+        transcript_text (str): The transcript text to generate notes from
+        summary (str): Optional summary of the whole transcript, given as context for every chunk
+        use_cache (bool): Whether identical earlier Gemini calls may be served from cache
+        
+    Returns:
+        str: Generated notes in markdown format
+    """
+    try:
+        def notes_for(chunk):
+            if summary is not None:
+                chunk = f'Summary: {summary} \n\n\nNotes:\n{chunk}'
+            return _generate_text(_notes_prompt(chunk), use_cache=use_cache)
         
         # Generate the response
         logger.info("Generating content with Gemini")
-        response = model.generate_content(prompt)
+        chunk_notes = map_chunks(notes_for, split_text(transcript_text))
+        notes = chunk_notes[0] if len(chunk_notes) == 1 else _stitch_notes(chunk_notes)
         logger.info("Content generation successful")
         
         # Save to file for caching
         with open("outputs/llm_output.txt", "w") as file:
-            file.write(response.text)
+            file.write(notes)
             file.close()
         
-        return response.text
+        return notes
     except Exception as e:
         logger.error(f"Error generating notes with Gemini: {str(e)}", exc_info=True)
         # Return a fallback response in case of error
         return f"Error generating notes: {str(e)}"
 
-def generate_flashcards(transcript_text):
-    """Generate flashcards from transcript text using Gemini."""
+def _stream_text(prompt, model_name=None):
+    """
+    Send a prompt to Gemini and yield the response text as it is generated.
+    
+    Shares the response cache with _generate_text: a cached response is
+    yielded as one piece, and a completed stream is cached.
+    """
+    model_name = model_name or DEFAULT_GEMINI_MODEL
+    params = GEMINI_MODEL_CONFIGS.get(model_name)
+    cached = llm_cache.get(model_name, prompt, params)
+    if cached is not None:
+        logger.info("Serving Gemini response from cache")
+        yield cached
+        return
+    
+    model = get_gemini_model(model_name)
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    llm_cache.put(model_name, prompt, "".join(parts), params)
+
+def stream_notes(transcript_text, summary=None, on_complete=None):
+    """
+    Generate lecture notes, yielding markdown deltas as Gemini emits them.
+    
+    Long transcripts stream every chunk's notes concurrently but yield them in
+    order, separated by horizontal rules. Once done, on_complete receives the
+    final notes, which for long transcripts are stitched under one outline
+    exactly like generate_notes. The outline needs every chunk's headings, so
+    for those transcripts the final notes differ from the concatenated deltas
+    and should replace them.
+    
+    Args:
+        transcript_text (str): The transcript text to generate notes from
+        summary (str): Optional summary of the whole transcript, given as context for every chunk
+        on_complete (callable): Called with the complete notes after the last delta
+        
+    Yields:
+        str: Pieces of markdown in document order
+    """
+    def prompt_for(chunk):
+        if summary is not None:
+            chunk = f'Summary: {summary} \n\n\nNotes:\n{chunk}'
+        return _notes_prompt(chunk)
+    
+    chunks = split_text(transcript_text)
+    chunk_notes = []
+    
+    if len(chunks) == 1:
+        parts = []
+        for delta in _stream_text(prompt_for(chunks[0])):
+            parts.append(delta)
+            yield delta
+        chunk_notes.append("".join(parts))
+    else:
+        # Every chunk streams into its own queue, ending with None or an exception
+        queues = [queue.Queue() for _ in chunks]
+        
+        def pump(index):
+            try:
+                for delta in _stream_text(prompt_for(chunks[index])):
+                    queues[index].put(delta)
+                queues[index].put(None)
+            except Exception as e:
+                queues[index].put(e)
+        
+        with ThreadPoolExecutor(max_workers=GEMINI_MAP_WORKERS) as executor:
+            for index in range(len(chunks)):
+                executor.submit(pump, index)
+            
+            for index, chunk_queue in enumerate(queues):
+                if index > 0:
+                    yield "\n\n---\n\n"
+                parts = []
+                while True:
+                    delta = chunk_queue.get()
+                    if delta is None:
+                        break
+                    if isinstance(delta, Exception):
+                        raise delta
+                    parts.append(delta)
+                    yield delta
+                chunk_notes.append("".join(parts))
+    
+    notes = chunk_notes[0] if len(chunk_notes) == 1 else _stitch_notes(chunk_notes)
+    logger.info("Streaming content generation successful")
+    if on_complete:
+        on_complete(notes)
+
+def _chunk_summary_prompt(text):
+    """Build the prompt condensing one chunk of a long text before it is summarized as a whole"""
+    return f"""Summarize the following part of a lecture transcript in at most 300 words.
+        Keep its key concepts, definitions, examples and conclusions, in the order they appear.
+        Respond with markdown bullet points only, without any introduction.
+
+        {text}
+        """
+
+def generate_summary(transcript_text, use_cache=True):
+    """
+    Generate a concise summary using Google's Gemini model.
+    
+    Long transcripts are condensed chunk by chunk with a short summary
+    prompt, repeatedly, until the condensed text fits in one chunk; that text
+    is then summarized as a whole.
+    
+    Args:
+        transcript_text (str): The transcript text to summarize
+        use_cache (bool): Whether identical earlier Gemini calls may be served from cache
+        
+    Returns:
+        str: Generated summary in markdown format
+    """
     try:
-        logger.info("Starting flashcard generation")
+        def summary_for(chunk):
+            return _generate_text(_notes_prompt(f'Please provide a concise summary of the following text:\n{chunk}'),
+                                  use_cache=use_cache)
+        
+        def condense(chunk):
+            return _generate_text(_chunk_summary_prompt(chunk), use_cache=use_cache)
         
-        # Initialize the model
-        logger.info("Initializing Gemini model")
-        model = genai.GenerativeModel('gemini-1.5-pro')
+        chunks = split_text(transcript_text)
+        while len(chunks) > 1:
+            logger.info(f"Condensing {len(chunks)} chunks before summarizing")
+            condensed = split_text("\n\n".join(map_chunks(condense, chunks)))
+            if len(condensed) >= len(chunks):
+                raise ValueError("Chunk summaries are not getting shorter")
+            chunks = condensed
         
-        # Construct the prompt for Gemini
-        prompt = f"""Based on the following transcript, generate 5-7 meaningful flashcards.
+        return summary_for(chunks[0])
+    except Exception as e:
+        logger.error(f"Error generating summary with Gemini: {str(e)}", exc_info=True)
+        return f"Error generating notes: {str(e)}"
+
+def _flashcards_prompt(transcript_text):
+    """Build the flashcards prompt"""
+    return f"""Based on the following transcript, generate 5-7 meaningful flashcards.
         Each flashcard should have a question on the front and a concise answer on the back.
         Focus on key concepts, definitions, and important points.
         Format the response as a JSON array of objects with 'question' and 'answer' fields.
@@ -92,47 +384,49 @@ def generate_flashcards(transcript_text):
             }}
         ]"""
 
-        # Get response from Gemini
-        response = model.generate_content(prompt)
-        logger.info("Received response from Gemini")
-        
-        # Clean the response text to remove any markdown formatting
-        response_text = response.text
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]  # Remove ```json
-        if response_text.startswith("```"):
-            response_text = response_text[3:]  # Remove ```
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]  # Remove trailing ```
-        
-        # Strip any leading/trailing whitespace
-        response_text = response_text.strip()
-        
-        try:
-            # Parse the cleaned JSON
-            flashcards = json.loads(response_text)
-            logger.info(f"Successfully generated {len(flashcards)} flashcards")
-            return flashcards
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing flashcard JSON: {str(e)}")
-            logger.error(f"Failed to parse JSON: {response_text}")
-            return []
+def _parse_flashcards(response_text):
+    """Parse Gemini's flashcard response into a list, or [] if it is not valid JSON"""
+    # Clean the response text to remove any markdown formatting
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]  # Remove ```json
+    if response_text.startswith("```"):
+        response_text = response_text[3:]  # Remove ```
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]  # Remove trailing ```
+    
+    # Strip any leading/trailing whitespace
+    response_text = response_text.strip()
+    
+    try:
+        # Parse the cleaned JSON
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing flashcard JSON: {str(e)}")
+        logger.error(f"Failed to parse JSON: {response_text}")
+        return []
+
+def generate_flashcards(transcript_text, use_cache=True):
+    """Generate flashcards from transcript text using Gemini."""
+    try:
+        logger.info("Starting flashcard generation")
+        
+        # Long transcripts get flashcards per chunk, with duplicates removed
+        def cards_for(chunk):
+            return _parse_flashcards(_generate_text(_flashcards_prompt(chunk), use_cache=use_cache))
+        
+        chunk_cards = map_chunks(cards_for, split_text(transcript_text))
+        flashcards = _combine_questions(chunk_cards)
+        
+        logger.info(f"Successfully generated {len(flashcards)} flashcards")
+        return flashcards
             
     except Exception as e:
         logger.error(f"Error generating flashcards: {str(e)}")
         return [] 
 
-def generate_mindmap(transcript_text):
-    """Generate a mind map structure from transcript text using Gemini."""
-    try:
-        logger.info("Starting mind map generation")
-        
-        # Initialize the model
-        logger.info("Initializing Gemini model")
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Construct the prompt for Gemini
-        prompt = f"""Based on the following transcript, generate a well-structured mind map.
+def _mindmap_prompt(transcript_text):
+    """Build the mind map prompt"""
+    return f"""Based on the following transcript, generate a well-structured mind map.
         Follow these specific guidelines for the mind map structure:
 
         1. Central Topic:
@@ -182,118 +476,145 @@ def generate_mindmap(transcript_text):
         - Focus on key concepts and their relationships
         - Return ONLY the JSON object, no additional text or explanations"""
 
-        # Get response from Gemini
-        response = model.generate_content(prompt)
-        logger.info("Received response from Gemini")
-        
-        # Clean the response text to remove any markdown formatting
-        response_text = response.text.strip()
+def _mindmap_error(name, description):
+    """Build the mind map returned when generation fails"""
+    return {
+        "topic": "Error in Mind Map Generation",
+        "branches": [
+            {
+                "name": "Error",
+                "type": "error",
+                "subbranches": [
+                    {
+                        "name": name,
+                        "description": description
+                    }
+                ]
+            }
+        ]
+    }
+
+def _parse_mindmap(response_text):
+    """
+    Parse and validate Gemini's mind map response.
+    
+    Returns:
+        dict: The mind map, or an error mind map if the response is not valid JSON
         
-        # Remove any markdown code block syntax
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
+    Raises:
+        ValueError: If the response has no JSON object or an invalid structure
+    """
+    # Clean the response text to remove any markdown formatting
+    response_text = response_text.strip()
+    
+    # Remove any markdown code block syntax
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    
+    # Find the first '{' and last '}' to extract just the JSON object
+    start_idx = response_text.find('{')
+    end_idx = response_text.rfind('}')
+    
+    if start_idx == -1 or end_idx == -1:
+        raise ValueError("No valid JSON object found in response")
         
-        # Find the first '{' and last '}' to extract just the JSON object
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}')
+    response_text = response_text[start_idx:end_idx + 1].strip()
+    
+    try:
+        # Parse the cleaned JSON
+        mindmap = json.loads(response_text)
         
-        if start_idx == -1 or end_idx == -1:
-            raise ValueError("No valid JSON object found in response")
-            
-        response_text = response_text[start_idx:end_idx + 1].strip()
+        # Validate the structure
+        if not isinstance(mindmap, dict) or 'topic' not in mindmap or 'branches' not in mindmap:
+            raise ValueError("Invalid mind map structure")
         
-        try:
-            # Parse the cleaned JSON
-            mindmap = json.loads(response_text)
+        # Validate and process each branch
+        for branch in mindmap['branches']:
+            if not isinstance(branch, dict) or 'name' not in branch:
+                raise ValueError("Invalid branch structure")
             
-            # Validate the structure
-            if not isinstance(mindmap, dict) or 'topic' not in mindmap or 'branches' not in mindmap:
-                raise ValueError("Invalid mind map structure")
+            # Ensure type exists
+            if 'type' not in branch:
+                branch['type'] = 'concept'
             
-            # Validate and process each branch
-            for branch in mindmap['branches']:
-                if not isinstance(branch, dict) or 'name' not in branch:
-                    raise ValueError("Invalid branch structure")
-                
-                # Ensure type exists
-                if 'type' not in branch:
-                    branch['type'] = 'concept'
-                
-                # Validate subbranches
-                if 'subbranches' in branch:
-                    if not isinstance(branch['subbranches'], list):
-                        branch['subbranches'] = []
-                    else:
-                        # Ensure each subbranch has required fields
-                        for subbranch in branch['subbranches']:
-                            if not isinstance(subbranch, dict) or 'name' not in subbranch:
-                                branch['subbranches'].remove(subbranch)
-                            if 'description' not in subbranch:
-                                subbranch['description'] = ""
-                else:
+            # Validate subbranches
+            if 'subbranches' in branch:
+                if not isinstance(branch['subbranches'], list):
                     branch['subbranches'] = []
-            
-            logger.info("Successfully generated and validated mind map structure")
-            return mindmap
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing mind map JSON: {str(e)}")
-            logger.error(f"Failed to parse JSON: {response_text}")
-            return {
-                "topic": "Error in Mind Map Generation",
-                "branches": [
-                    {
-                        "name": "Error",
-                        "type": "error",
-                        "subbranches": [
-                            {
-                                "name": "Failed to parse response",
-                                "description": str(e)
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-    except Exception as e:
-        logger.error(f"Error generating mind map: {str(e)}")
-        return {
-            "topic": "Error in Mind Map Generation",
-            "branches": [
-                {
-                    "name": "Error",
-                    "type": "error",
-                    "subbranches": [
-                        {
-                            "name": "Generation failed",
-                            "description": str(e)
-                        }
-                    ]
-                }
-            ]
-        } 
+                else:
+                    # Ensure each subbranch has required fields
+                    for subbranch in branch['subbranches']:
+                        if not isinstance(subbranch, dict) or 'name' not in subbranch:
+                            branch['subbranches'].remove(subbranch)
+                        if 'description' not in subbranch:
+                            subbranch['description'] = ""
+            else:
+                branch['subbranches'] = []
+        
+        return mindmap
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing mind map JSON: {str(e)}")
+        logger.error(f"Failed to parse JSON: {response_text}")
+        return _mindmap_error("Failed to parse response", str(e))
 
-def generate_quiz(transcript_text):
+def _merge_mindmaps(mindmaps):
     """
-    Generate quiz questions based on the transcript text.
+    Merge the mind maps generated for each chunk.
     
-    Args:
-        transcript_text (str): The transcript text to generate quiz questions from
-        
-    Returns:
-        list: A list of quiz questions with multiple choice options
+    Branches with the same name are combined and their sub-branches deduplicated
+    by name. The topic of the first chunk is kept as the central topic.
     """
+    if len(mindmaps) == 1:
+        return mindmaps[0]
+    
+    valid = [m for m in mindmaps if not any(b.get("type") == "error" for b in m["branches"])]
+    if not valid:
+        return mindmaps[0]
+    
+    branches = {}
+    for mindmap in valid:
+        for branch in mindmap["branches"]:
+            key = branch["name"].strip().lower()
+            if key not in branches:
+                branches[key] = dict(branch, subbranches=[])
+            names = {sub["name"].strip().lower() for sub in branches[key]["subbranches"]}
+            for subbranch in branch["subbranches"]:
+                if subbranch["name"].strip().lower() not in names:
+                    names.add(subbranch["name"].strip().lower())
+                    branches[key]["subbranches"].append(subbranch)
+    
+    return {
+        "topic": valid[0]["topic"],
+        "branches": list(branches.values())
+    }
+
+def generate_mindmap(transcript_text, use_cache=True):
+    """Generate a mind map structure from transcript text using Gemini."""
     try:
-        # Initialize the model
-        logger.info("Initializing Gemini model for quiz generation")
-        model = genai.GenerativeModel('gemini-1.5-pro')
+        logger.info("Starting mind map generation")
+        
+        # Long transcripts get a mind map per chunk, merged branch by branch
+        def mindmap_for(chunk):
+            return _parse_mindmap(_generate_text(_mindmap_prompt(chunk), use_cache=use_cache))
+        
+        mindmaps = map_chunks(mindmap_for, split_text(transcript_text))
+        mindmap = _merge_mindmaps(mindmaps)
         
-        # Create the prompt
-        prompt = f"""You are an AI that generates meaningful multiple-choice quiz questions from transcriptions.
+        logger.info("Successfully generated and validated mind map structure")
+        return mindmap
+            
+    except Exception as e:
+        logger.error(f"Error generating mind map: {str(e)}")
+        return _mindmap_error("Generation failed", str(e))
+
+def _quiz_prompt(transcript_text):
+    """Build the quiz prompt"""
+    return f"""You are an AI that generates meaningful multiple-choice quiz questions from transcriptions.
         
         Generate 5 multiple-choice quiz questions from the following transcription:
         {transcript_text}
@@ -314,33 +635,134 @@ def generate_quiz(transcript_text):
             ...
           ]
         """
+
+def _parse_quiz(response_text):
+    """Parse Gemini's quiz response into a list, or [] if it has no valid JSON array"""
+    try:
+        # Find the JSON part in the response
+        json_start = response_text.find('[')
+        json_end = response_text.rfind(']') + 1
         
+        if json_start >= 0 and json_end > json_start:
+            json_str = response_text[json_start:json_end]
+            return json.loads(json_str)
+        else:
+            logger.error("Could not find JSON in response")
+            return []
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing JSON: {e}")
+        logger.error(f"Response text: {response_text}")
+        return []
+
+def generate_quiz(transcript_text, use_cache=True):
+    """
+    Generate quiz questions based on the transcript text.
+    
+    Args:
+        transcript_text (str): The transcript text to generate quiz questions from
+        use_cache (bool): Whether identical earlier Gemini calls may be served from cache
+        
+    Returns:
+        list: A list of quiz questions with multiple choice options
+    """
+    try:
         # Generate the response
         logger.info("Generating quiz questions with Gemini")
-        response = model.generate_content(prompt)
         
-        # Extract the response text
-        response_text = response.text
+        # Long transcripts get questions per chunk, with duplicates removed
+        def questions_for(chunk):
+            return _parse_quiz(_generate_text(_quiz_prompt(chunk), use_cache=use_cache))
         
-        # Parse the JSON response
-        try:
-            # Find the JSON part in the response
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
+        chunk_questions = map_chunks(questions_for, split_text(transcript_text))
+        quiz_data = _combine_questions(chunk_questions)
+        
+        logger.info(f"Successfully generated {len(quiz_data)} quiz questions")
+        return quiz_data
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                quiz_data = json.loads(json_str)
-                logger.info(f"Successfully generated {len(quiz_data)} quiz questions")
-                return quiz_data
-            else:
-                logger.error("Could not find JSON in response")
-                return []
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON: {e}")
-            logger.error(f"Response text: {response_text}")
-            return []
+    except Exception as e:
+        logger.error(f"Error generating quiz: {e}")
+        return []
+
+# Async variants used by the ASGI serving mode, which awaits Gemini instead of
+# holding a thread for every in-flight request
+
+async def _agenerate_text(prompt, model_name=None, use_cache=True):
+    """Async version of _generate_text, sharing the same response cache"""
+    model_name = model_name or DEFAULT_GEMINI_MODEL
+    params = GEMINI_MODEL_CONFIGS.get(model_name)
+    if use_cache:
+        # Only the memory tier is read on the event loop, disk reads run in a thread
+        cached = llm_cache.get_memory(model_name, prompt, params)
+        if cached is None:
+            cached = await asyncio.to_thread(llm_cache.get, model_name, prompt, params)
+        if cached is not None:
+            logger.info("Serving Gemini response from cache")
+            return cached
+    
+    model = get_gemini_model(model_name)
+    response = await model.generate_content_async(prompt)
+    logger.info("Received response from Gemini")
+    
+    await asyncio.to_thread(llm_cache.put, model_name, prompt, response.text, params)
+    return response.text
+
+async def amap_chunks(fn, chunks):
+    """Await fn on every chunk with at most GEMINI_MAP_WORKERS in flight, returning results in chunk order"""
+    semaphore = asyncio.Semaphore(GEMINI_MAP_WORKERS)
+    
+    async def run(chunk):
+        async with semaphore:
+            return await fn(chunk)
+    
+    return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+async def agenerate_flashcards(transcript_text, use_cache=True):
+    """Async version of generate_flashcards."""
+    try:
+        logger.info("Starting flashcard generation")
+        
+        async def cards_for(chunk):
+            return _parse_flashcards(await _agenerate_text(_flashcards_prompt(chunk), use_cache=use_cache))
+        
+        flashcards = _combine_questions(await amap_chunks(cards_for, split_text(transcript_text)))
+        
+        logger.info(f"Successfully generated {len(flashcards)} flashcards")
+        return flashcards
+            
+    except Exception as e:
+        logger.error(f"Error generating flashcards: {str(e)}")
+        return []
+
+async def agenerate_mindmap(transcript_text, use_cache=True):
+    """Async version of generate_mindmap."""
+    try:
+        logger.info("Starting mind map generation")
+        
+        async def mindmap_for(chunk):
+            return _parse_mindmap(await _agenerate_text(_mindmap_prompt(chunk), use_cache=use_cache))
+        
+        mindmap = _merge_mindmaps(await amap_chunks(mindmap_for, split_text(transcript_text)))
+        
+        logger.info("Successfully generated and validated mind map structure")
+        return mindmap
+            
+    except Exception as e:
+        logger.error(f"Error generating mind map: {str(e)}")
+        return _mindmap_error("Generation failed", str(e))
+
+async def agenerate_quiz(transcript_text, use_cache=True):
+    """Async version of generate_quiz."""
+    try:
+        logger.info("Generating quiz questions with Gemini")
+        
+        async def questions_for(chunk):
+            return _parse_quiz(await _agenerate_text(_quiz_prompt(chunk), use_cache=use_cache))
+        
+        quiz_data = _combine_questions(await amap_chunks(questions_for, split_text(transcript_text)))
+        
+        logger.info(f"Successfully generated {len(quiz_data)} quiz questions")
+        return quiz_data
             
     except Exception as e:
         logger.error(f"Error generating quiz: {e}")
-        return [] 
\ No newline at end of file
+        return []
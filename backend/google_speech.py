@@ -1,14 +1,41 @@
 from google.cloud import speech
-from google.cloud import storage
 import os
 import time
 import uuid
 import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from clients import get_speech_client, get_storage_client
+from stt_poller import stt_poller
+from transcript_model import WordTranscript, stitch_segments
+from media_tools import FFMPEG_BINARY, probe_duration
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Length of each transcribed segment and how much consecutive segments overlap
+STT_SEGMENT_SECONDS = float(os.environ.get("STT_SEGMENT_SECONDS", 300))
+STT_OVERLAP_SECONDS = float(os.environ.get("STT_OVERLAP_SECONDS", 10))
+
+# Maximum segments uploaded or recognized inline at once across all tasks
+STT_MAX_CONCURRENCY = int(os.environ.get("STT_MAX_CONCURRENCY", 8))
+
+# Maximum long-running recognitions in flight across all tasks, and how long one may take
+STT_MAX_OPERATIONS = int(os.environ.get("STT_MAX_OPERATIONS", 100))
+STT_SEGMENT_TIMEOUT = int(os.environ.get("STT_SEGMENT_TIMEOUT", 900))
+
+# Segments up to this long are sent inline with a synchronous recognize instead of
+# through GCS; the API accepts at most 60 seconds and 10 MB of inline audio
+STT_INLINE_MAX_SECONDS = float(os.environ.get("STT_INLINE_MAX_SECONDS", 55))
+STT_INLINE_MAX_BYTES = 10 * 1024 * 1024
+
+# Shared by every transcription so concurrent tasks respect one limit
+STT_WORKERS = ThreadPoolExecutor(max_workers=STT_MAX_CONCURRENCY, thread_name_prefix="stt")
+STT_OPERATION_SLOTS = threading.BoundedSemaphore(STT_MAX_OPERATIONS)
+
 def upload_to_gcs(file_path, bucket_name):
     """
     Upload a file to Google Cloud Storage.
@@ -21,9 +48,7 @@ def upload_to_gcs(file_path, bucket_name):
         str: GCS URI of the uploaded file
     """
     try:
-        logger.info(f"Initializing GCS client for bucket: {bucket_name}")
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        bucket = get_storage_client().bucket(bucket_name)
         
         # Generate a unique blob name
         blob_name = f"audio/{uuid.uuid4()}{os.path.splitext(file_path)[1]}"
@@ -45,92 +70,321 @@ def upload_to_gcs(file_path, bucket_name):
         logger.error(f"Failed to upload to GCS: {str(e)}", exc_info=True)
         raise
 
-def transcribe_audio(audio_path, language_code="en-US", bucket_name="your-bucket-name"):
+def split_audio(audio_path, output_dir, duration):
     """
-    Asynchronously transcribe audio to text using Google Speech-to-Text API.
+    Cut audio into overlapping 16 kHz mono FLAC segments.
     
     Args:
         audio_path (str): Path to the audio file
-        language_code (str): Language code for transcription (default: "en-US")
-        bucket_name (str): Name of the GCS bucket to store audio files
+        output_dir (str): Directory the segments are written to
+        duration (float): Duration of the audio in seconds
         
     Returns:
-        dict: Dictionary containing the transcription and confidence score
+        list: (start offset in seconds, segment path) tuples in order
     """
+    segments = []
+    start = 0.0
+    while start < duration:
+        segment_path = os.path.join(output_dir, f"segment_{len(segments):04d}.flac")
+        subprocess.run(
+            [FFMPEG_BINARY, "-v", "error", "-y", "-ss", str(start), "-t", str(STT_SEGMENT_SECONDS + STT_OVERLAP_SECONDS),
+             "-i", audio_path, "-ac", "1", "-ar", "16000", "-c:a", "flac", segment_path],
+            check=True
+        )
+        segments.append((start, segment_path))
+        start += STT_SEGMENT_SECONDS
+    return segments
+
+def speech_encoding(audio_path):
+    """Pick the recognition encoding from the audio file's extension."""
+    if audio_path.endswith(".wav"):
+        return speech.RecognitionConfig.AudioEncoding.LINEAR16
+    if audio_path.endswith(".flac"):
+        return speech.RecognitionConfig.AudioEncoding.FLAC
+    raise ValueError(f"Unsupported segment format: {audio_path}")
+
+def recognition_config(language_code, encoding):
+    """Build the recognition config shared by inline and GCS requests."""
+    return speech.RecognitionConfig(
+        encoding=encoding,
+        sample_rate_hertz=16000,
+        language_code=language_code,
+        enable_automatic_punctuation=True,
+        enable_word_time_offsets=True,
+        enable_word_confidence=True
+    )
+
+def delete_from_gcs(gcs_uri, bucket_name):
+    """Delete a temporary upload, logging rather than raising on failure."""
+    try:
+        bucket = get_storage_client().bucket(bucket_name)
+        bucket.blob(gcs_uri.replace(f"gs://{bucket_name}/", "")).delete()
+    except Exception as e:
+        logger.error(f"Failed to delete GCS file: {str(e)}", exc_info=True)
+
+def recognize_inline(segment_path, language_code):
+    """Recognize short audio with a synchronous request carrying its bytes."""
+    with open(segment_path, "rb") as f:
+        audio = speech.RecognitionAudio(content=f.read())
+    config = recognition_config(language_code, speech_encoding(segment_path))
+    return get_speech_client().recognize(config=config, audio=audio, timeout=STT_SEGMENT_TIMEOUT)
+
+def segment_words(response, offset):
+    """Get (word, start, end, confidence) tuples of a response, timed relative to the whole file."""
+    words = []
+    for result in response.results:
+        for word_info in result.alternatives[0].words:
+            words.append((
+                word_info.word,
+                offset + word_info.start_time.total_seconds(),
+                offset + word_info.end_time.total_seconds(),
+                word_info.confidence
+            ))
+    return words
+
+class Transcription:
+    """
+    Collects the segments of one audio file as their recognitions finish.
+    
+    Segments can be added while earlier ones are already being recognized;
+    the transcript is assembled once the transcription is closed and every
+    added segment has finished.
+    """
+    
+    def __init__(self, on_complete):
+        self.on_complete = on_complete
+        self.marks = [("started", time.time())]
+        self.duration = None
+        self.offsets = []
+        self.segments = []
+        self.remaining = 0
+        self.closed = False
+        self.finished = False
+        self.lock = threading.Lock()
+    
+    def mark(self, name):
+        """Record the end of a preparation phase, reported in the stt timings."""
+        self.marks.append((name, time.time()))
+    
+    def add_segment(self, offset):
+        """Register a segment starting at offset seconds, returning its index."""
+        with self.lock:
+            self.offsets.append(offset)
+            self.segments.append(None)
+            self.remaining += 1
+            return len(self.offsets) - 1
+    
+    def close(self, duration):
+        """Declare that no more segments will be added."""
+        with self.lock:
+            self.closed = True
+            self.duration = duration
+            if self.finished or self.remaining:
+                return
+            self.finished = True
+        self.complete()
+    
+    def cancel(self):
+        """Drop the transcription; on_complete will not be called."""
+        with self.lock:
+            self.finished = True
+    
+    def segment_done(self, index, result=None, error=None):
+        """Record a segment's result or error, finishing the transcription after the last one."""
+        with self.lock:
+            if self.finished:
+                return
+            if error is None:
+                self.segments[index] = result
+                self.remaining -= 1
+            self.finished = error is not None or (self.closed and self.remaining == 0)
+            if not self.finished:
+                return
+        if error is not None:
+            logger.error(f"Failed to transcribe segment at {self.offsets[index]:.0f}s: {str(error)}")
+            self.on_complete({"text": "", "confidence": 0, "error": str(error)})
+        else:
+            self.complete()
+    
+    def complete(self):
+        if not self.segments:
+            self.on_complete({"text": "", "confidence": 0, "error": "Audio file is empty"})
+        else:
+            self.on_complete(finish_transcription(self))
+
+def start_segment(transcription, index, segment_path, duration, language_code, bucket_name):
+    """
+    Start recognizing one segment.
+    
+    Short segments are recognized inline right away. Longer ones are uploaded
+    to GCS and their long-running operation is handed to the poller, so no
+    thread waits on it.
+    """
+    offset = transcription.offsets[index]
+    started = time.time()
+    inline = duration <= STT_INLINE_MAX_SECONDS and os.path.getsize(segment_path) <= STT_INLINE_MAX_BYTES
+    try:
+        if inline:
+            response = recognize_inline(segment_path, language_code)
+            logger.info(f"Transcribed segment at {offset:.0f}s inline")
+            transcription.segment_done(index, {
+                "words": segment_words(response, offset), "path": "inline", "seconds": time.time() - started
+            })
+            return
+        gcs_uri = upload_to_gcs(segment_path, bucket_name)
+    except Exception as e:
+        transcription.segment_done(index, error=e)
+        return
+    
+    def on_done(response, error):
+        delete_from_gcs(gcs_uri, bucket_name)
+        STT_OPERATION_SLOTS.release()
+        if error is not None:
+            transcription.segment_done(index, error=error)
+            return
+        logger.info(f"Transcribed segment at {offset:.0f}s via gcs")
+        transcription.segment_done(index, {
+            "words": segment_words(response, offset), "path": "gcs", "seconds": time.time() - started
+        })
+    
+    STT_OPERATION_SLOTS.acquire()
     try:
-        logger.info(f"Starting transcription process for file: {audio_path}")
-        logger.info(f"Using bucket: {bucket_name} and language: {language_code}")
-        
-        # Check if file exists
-        if not os.path.exists(audio_path):
-            logger.error(f"Audio file not found: {audio_path}")
-            return {
-                "text": "",
-                "confidence": 0,
-                "error": "Audio file not found"
-            }
-        
-        # Upload the audio file to GCS
-        gcs_uri = upload_to_gcs(audio_path, bucket_name)
-        
-        # Initialize the Speech-to-Text client
-        logger.info("Initializing Speech-to-Text client")
-        client = speech.SpeechClient()
-        
-        # Configure the recognition request
-        logger.info("Configuring recognition request")
         audio = speech.RecognitionAudio(uri=gcs_uri)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.MP3,
-            sample_rate_hertz=16000,  # Standard sample rate
-            language_code=language_code,
-            enable_automatic_punctuation=True,
-            enable_word_time_offsets=True,
-            enable_word_confidence=True
-        )
-        
-        # Start the long-running operation
-        logger.info("Starting long-running recognition operation")
-        operation = client.long_running_recognize(config=config, audio=audio)
-        
-        logger.info("Waiting for operation to complete...")
-        response = operation.result(timeout=300)  # Wait up to 5 minutes for completion
-        logger.info("Operation completed successfully")
-        
-        # Extract the transcribed text and confidence scores
-        transcription = ""
-        confidence_scores = []
-        
-        logger.info("Processing transcription results")
-        for result in response.results:
-            for word_info in result.alternatives[0].words:
-                transcription += word_info.word + " "
-                confidence_scores.append(word_info.confidence)
-        
-        # Calculate average confidence score
-        avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
-        logger.info(f"Transcription completed with average confidence: {avg_confidence}")
-        
-        # Clean up the GCS file
-        try:
-            logger.info("Cleaning up GCS file")
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(bucket_name)
-            blob = bucket.blob(gcs_uri.replace(f"gs://{bucket_name}/", ""))
-            blob.delete()
-            logger.info("GCS file cleanup successful")
-        except Exception as e:
-            logger.error(f"Failed to delete GCS file: {str(e)}", exc_info=True)
+        config = recognition_config(language_code, speech_encoding(segment_path))
+        operation = get_speech_client().long_running_recognize(config=config, audio=audio)
+    except Exception as e:
+        on_done(None, e)
+        return
+    stt_poller.watch(operation, on_done, STT_SEGMENT_TIMEOUT)
+
+def submit_segment(transcription, segment_path, offset, duration, language_code="en-US", bucket_name="your-bucket-name"):
+    """
+    Add a segment to a transcription and start recognizing it on STT_WORKERS.
+    
+    Returns:
+        Future: Done once the segment is uploaded or recognized inline, after
+        which its file may be deleted
+    """
+    index = transcription.add_segment(offset)
+    return STT_WORKERS.submit(start_segment, transcription, index, segment_path, duration, language_code, bucket_name)
+
+def finish_transcription(transcription):
+    """
+    Stitch the recognized segments of a transcription into its transcript.
+    
+    Returns:
+        dict: Dictionary containing the transcription, confidence score and
+        serialized word timings, and under "stt" the recognition path taken
+        and its timings
+    """
+    segments = transcription.segments
+    words = stitch_segments(
+        [(offset, segment["words"]) for offset, segment in zip(transcription.offsets, segments)],
+        STT_OVERLAP_SECONDS
+    )
+    
+    # Calculate average confidence score
+    confidence_scores = [word[3] for word in words]
+    avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
+    
+    # Each preparation phase lasted from the previous mark to its own
+    now = time.time()
+    marks = transcription.marks
+    timings = {name: at - marks[i - 1][1] for i, (name, at) in enumerate(marks) if i > 0}
+    timings["recognize"] = now - marks[-1][1]
+    timings["slowest_segment"] = max((segment["seconds"] for segment in segments), default=0)
+    timings["total"] = now - marks[0][1]
+    
+    paths = {segment["path"] for segment in segments}
+    stt = {
+        "path": paths.pop() if len(paths) == 1 else "mixed",
+        "duration": transcription.duration,
+        "segments": len(segments),
+        "timings": timings
+    }
+    logger.info(f"Transcription completed in {stt['timings']['total']:.1f}s with average confidence: {avg_confidence}")
+    
+    # Keep the per-word timings and confidences in compact columns beside the text
+    word_transcript = WordTranscript.from_words(words)
+    return {
+        "text": word_transcript.text,
+        "confidence": avg_confidence,
+        "words": word_transcript.to_dict(),
+        "stt": stt
+    }
+
+def start_transcription(audio_path, on_complete, language_code="en-US", bucket_name="your-bucket-name"):
+    """
+    Submit audio for transcription without waiting for the recognition.
+    
+    The audio is cut into overlapping segments which are uploaded (at most
+    STT_MAX_CONCURRENCY at a time across all tasks) and submitted; this call
+    returns once every segment is submitted. on_complete later receives the
+    same dictionary transcribe_audio returns, on a poller callback thread.
+    
+    Args:
+        audio_path (str): Path to the audio file
+        on_complete (callable): Receives the transcript dictionary
+        language_code (str): Language code for transcription (default: "en-US")
+        bucket_name (str): Name of the GCS bucket to store audio files
+    """
+    logger.info(f"Starting transcription process for file: {audio_path}")
+    logger.info(f"Using bucket: {bucket_name} and language: {language_code}")
+    
+    # Check if file exists
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    
+    transcription = Transcription(on_complete)
+    duration = probe_duration(audio_path)
+    transcription.mark("probe")
+    
+    with tempfile.TemporaryDirectory(prefix="stt_") as segment_dir:
+        segments = split_audio(audio_path, segment_dir, duration)
+        transcription.mark("split")
+        logger.info(f"Transcribing {duration:.0f}s of audio in {len(segments)} segments")
         
-        return {
-            "text": transcription.strip(),
-            "confidence": avg_confidence
-        }
+        futures = [
+            submit_segment(
+                transcription, segment_path, offset,
+                min(duration - offset, STT_SEGMENT_SECONDS + STT_OVERLAP_SECONDS),
+                language_code, bucket_name
+            )
+            for offset, segment_path in segments
+        ]
+        transcription.close(duration)
+        # Segment files must stay on disk until they are uploaded or sent inline
+        for future in futures:
+            future.result()
+
+def transcribe_audio(audio_path, language_code="en-US", bucket_name="your-bucket-name"):
+    """
+    Transcribe audio to text using Google Speech-to-Text API, waiting for the result.
+    
+    Args:
+        audio_path (str): Path to the audio file
+        language_code (str): Language code for transcription (default: "en-US")
+        bucket_name (str): Name of the GCS bucket to store audio files
         
+    Returns:
+        dict: Dictionary containing the transcription and confidence score, and
+        under "stt" the recognition path taken and its timings
+    """
+    done = threading.Event()
+    transcript = {}
+    
+    def on_complete(result):
+        transcript.update(result)
+        done.set()
+    
+    try:
+        start_transcription(audio_path, on_complete, language_code, bucket_name)
+        done.wait()
+        return transcript
     except Exception as e:
         logger.error(f"Failed to transcribe audio: {str(e)}", exc_info=True)
         return {
             "text": "",
             "confidence": 0,
             "error": str(e)
-        } 
\ No newline at end of file
+        }
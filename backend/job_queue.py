@@ -0,0 +1,212 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Worker pools per stage type. "media" runs CPU-bound decoding (moviepy/ffmpeg),
+# "io" runs stages that mostly wait on Gemini or Google Cloud.
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", 2))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 8))
+
+# Maximum number of jobs waiting across all pools before new work is rejected; once
+# the queue is shared (see JobScheduler.share_queue) this also bounds every process together
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 50))
+
+# How often published queue positions are refreshed while their jobs wait
+QUEUE_HEARTBEAT_SECONDS = int(os.environ.get("QUEUE_HEARTBEAT_SECONDS", 30))
+
+# Retry hint used before any job has finished and an average is known
+DEFAULT_JOB_SECONDS = 60
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be admitted because the queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class _Job:
+    def __init__(self, task_id, fn, args, kwargs):
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+
+class _Pool:
+    """A fixed set of worker threads draining one FIFO queue."""
+
+    def __init__(self, name, workers, scheduler):
+        self.name = name
+        self.workers = workers
+        self.scheduler = scheduler
+        self.pending = deque()
+        self.running = 0
+        self.avg_seconds = None
+        self.condition = threading.Condition(scheduler.lock)
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                job = self.pending.popleft()
+                self.running += 1
+                self.scheduler._positions_changed.set()
+
+            started = time.monotonic()
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"Job for task {job.task_id} failed in {self.name} pool: {str(e)}", exc_info=True)
+            finally:
+                elapsed = time.monotonic() - started
+                with self.condition:
+                    self.running -= 1
+                    # Exponential moving average of job duration for retry hints
+                    if self.avg_seconds is None:
+                        self.avg_seconds = elapsed
+                    else:
+                        self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * elapsed
+
+    def estimated_wait(self):
+        """Rough number of seconds until a newly queued job would start."""
+        per_job = self.avg_seconds or DEFAULT_JOB_SECONDS
+        return per_job * (len(self.pending) + 1) / self.workers
+
+
+class JobScheduler:
+    """
+    Bounded job queue with a dedicated worker pool per stage type.
+
+    Jobs are admitted through submit(), which raises QueueFullError once
+    MAX_QUEUED_JOBS are waiting. A running job can move its task to another
+    pool with handoff(); handoffs are never rejected because the task was
+    already admitted.
+
+    Queues live in this process. share_queue() publishes queue positions to
+    storage every process can read and extends the admission bound to the
+    jobs queued by all of them. Positions are within this process's pool, so
+    tasks queued in different processes can share a position.
+    """
+
+    def __init__(self, pools, max_queued):
+        self.lock = threading.Lock()
+        self.max_queued = max_queued
+        self._positions_changed = threading.Event()
+        self._count_queued = None
+        self.pools = {name: _Pool(name, workers, self) for name, workers in pools.items()}
+
+    def share_queue(self, publish, count_queued, heartbeat=QUEUE_HEARTBEAT_SECONDS):
+        """
+        Make the queue visible to, and bounded across, every worker process.
+
+        Args:
+            publish (callable): Called with (task_id, position) from a background
+                thread whenever a waiting task's position changes, again for every
+                waiting task each heartbeat, and with (task_id, None) once the task
+                leaves the queue
+            count_queued (callable): Returns the number of jobs waiting in all
+                processes, as published
+            heartbeat (float): Seconds between refreshes; a process that stops
+                refreshing its positions should have them ignored after a few
+        """
+        self._count_queued = count_queued
+        thread = threading.Thread(target=self._publish_positions, args=(publish, heartbeat),
+                                  name="queue-publisher", daemon=True)
+        thread.start()
+
+    def _publish_positions(self, publish, heartbeat):
+        published = {}
+        refreshed = time.monotonic()
+        while True:
+            # Bursts of queue changes are coalesced into one pass
+            self._positions_changed.wait(timeout=heartbeat)
+            self._positions_changed.clear()
+            with self.lock:
+                positions = {
+                    job.task_id: {"pool": pool.name, "position": index + 1}
+                    for pool in self.pools.values()
+                    for index, job in enumerate(pool.pending)
+                }
+            refresh = time.monotonic() - refreshed >= heartbeat
+            if refresh:
+                refreshed = time.monotonic()
+            for task_id in published.keys() - positions.keys():
+                self._publish_one(publish, task_id, None)
+            for task_id, position in positions.items():
+                if refresh or published.get(task_id) != position:
+                    self._publish_one(publish, task_id, position)
+            published = positions
+
+    def _publish_one(self, publish, task_id, position):
+        try:
+            publish(task_id, position)
+        except Exception as e:
+            logger.error(f"Error publishing queue position of task {task_id}: {str(e)}", exc_info=True)
+
+    def _queued(self):
+        return sum(len(pool.pending) for pool in self.pools.values())
+
+    def _enqueue(self, pool_name, task_id, fn, args, kwargs, admitted):
+        pool = self.pools[pool_name]
+        with pool.condition:
+            if not admitted and self._queued() >= self.max_queued:
+                retry_after = max(1, int(round(pool.estimated_wait())))
+                logger.warning(f"Rejecting task {task_id}: {self._queued()} jobs queued")
+                raise QueueFullError(retry_after)
+            pool.pending.append(_Job(task_id, fn, args, kwargs))
+            pool.condition.notify()
+            self._positions_changed.set()
+        logger.info(f"Queued task {task_id} on {pool_name} pool")
+
+    def submit(self, pool_name, task_id, fn, *args, **kwargs):
+        """
+        Queue a new job.
+
+        Args:
+            pool_name (str): Pool to run the job in ("media" or "io")
+            task_id (str): Task the job belongs to, used for published queue positions
+            fn (callable): Function to run in a worker thread
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        # Checked outside the lock since it reads shared storage; the bound is approximate
+        if self._count_queued is not None and self._count_queued() >= self.max_queued:
+            retry_after = max(1, int(round(self.pools[pool_name].estimated_wait())))
+            logger.warning(f"Rejecting task {task_id}: queues of all processes are full")
+            raise QueueFullError(retry_after)
+        self._enqueue(pool_name, task_id, fn, args, kwargs, admitted=False)
+
+    def handoff(self, pool_name, task_id, fn, *args, **kwargs):
+        """Queue the next stage of an already admitted task."""
+        self._enqueue(pool_name, task_id, fn, args, kwargs, admitted=True)
+
+    def stats(self):
+        """Get queue depth and worker usage for every pool."""
+        with self.lock:
+            return {
+                name: {
+                    "workers": pool.workers,
+                    "running": pool.running,
+                    "queued": len(pool.pending),
+                    "avg_job_seconds": pool.avg_seconds
+                }
+                for name, pool in self.pools.items()
+            }
+
+
+scheduler = JobScheduler({"media": MEDIA_WORKERS, "io": IO_WORKERS}, MAX_QUEUED_JOBS)
@@ -0,0 +1,169 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory and byte budget of the on-disk tier
+LLM_CACHE_FOLDER = os.environ.get("LLM_CACHE_FOLDER", "llm_cache")
+LLM_CACHE_DISK_BYTES = int(os.environ.get("LLM_CACHE_DISK_BYTES", 200 * 1024 * 1024))
+
+# Number of responses kept in the in-memory tier
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", 256))
+
+
+def cache_key(model_name, prompt, params=None):
+    """
+    Build the cache key for a model call.
+
+    Args:
+        model_name (str): Name of the model the prompt is sent to
+        prompt (str): The full prompt
+        params (dict): Generation parameters that affect the response
+
+    Returns:
+        str: Hex digest identifying the call
+    """
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    key = json.dumps({"model": model_name, "prompt": prompt_hash, "params": params or {}}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of LLM response texts.
+
+    Recent responses are kept in an in-memory LRU. Every response is also
+    written to disk, where the least recently used files are evicted once the
+    tier grows past its byte budget.
+    """
+
+    def __init__(self, folder, disk_bytes, memory_entries):
+        self.folder = folder
+        self.disk_bytes = disk_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(folder, exist_ok=True)
+        self._disk_used = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.txt")
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_memory(self, model_name, prompt, params=None):
+        """Get a response text from the in-memory tier only, or None without counting a miss."""
+        key = cache_key(model_name, prompt, params)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+        return None
+
+    def get(self, model_name, prompt, params=None):
+        """Get a cached response text, or None on a miss."""
+        key = cache_key(model_name, prompt, params)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+            # Touch the file so disk eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        except Exception as e:
+            logger.error(f"Error reading LLM cache entry: {str(e)}")
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, model_name, prompt, text, params=None):
+        """Store a response text in both tiers."""
+        key = cache_key(model_name, prompt, params)
+        with self._lock:
+            self._remember(key, text)
+            self._stats["stores"] += 1
+
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(text)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing LLM cache entry: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._disk_used += size
+            over_budget = self._disk_used > self.disk_bytes
+        if over_budget:
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used files until the disk tier is at 90% of its budget."""
+        entries = sorted(
+            (entry for entry in os.scandir(self.folder) if entry.is_file() and entry.name.endswith(".txt")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        used = sum(entry.stat().st_size for entry in entries)
+        target = self.disk_bytes * 0.9
+        evicted = 0
+        for entry in entries:
+            if used <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                used -= size
+                evicted += 1
+            except FileNotFoundError:
+                continue
+        with self._lock:
+            self._disk_used = used
+            self._stats["evictions"] += evicted
+        logger.info(f"Evicted {evicted} LLM cache entries, {used} bytes on disk")
+
+    def stats(self):
+        """Get hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return dict(
+                self._stats,
+                hit_rate=hits / lookups if lookups else 0,
+                memory_entries=len(self._memory),
+                disk_bytes=self._disk_used
+            )
+
+
+llm_cache = LLMResponseCache(LLM_CACHE_FOLDER, LLM_CACHE_DISK_BYTES, LLM_CACHE_MEMORY_ENTRIES)
@@ -0,0 +1,25 @@
+import os
+import subprocess
+
+# ffmpeg and ffprobe executables, shared by audio extraction and segmenting
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+# Bytes of ffmpeg's error output kept for the failure message
+STDERR_TAIL_BYTES = 4096
+
+
+def probe_duration(media_path):
+    """Get the duration of an audio or video file in seconds using ffprobe."""
+    output = subprocess.run(
+        [FFPROBE_BINARY, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", media_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip())
+
+
+def read_stderr_tail(stream):
+    """Read the last STDERR_TAIL_BYTES of a file ffmpeg wrote its errors to."""
+    stream.seek(0, os.SEEK_END)
+    stream.seek(max(0, stream.tell() - STDERR_TAIL_BYTES))
+    return stream.read().decode(errors="replace")
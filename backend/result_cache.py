@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Total bytes of cached results kept on disk before the least recently hit are evicted
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_BYTES", 1024 * 1024 * 1024))
+
+# Name of the index database inside the cache folder
+INDEX_FILENAME = "index.sqlite3"
+
+# Number of entries removed per eviction query
+EVICTION_BATCH = 100
+
+
+class ResultCache:
+    """
+    Size-bounded cache of processing results, one JSON file per key.
+
+    An SQLite index records each entry's key, size, creation time and last
+    hit, so lookups are a primary-key read and eviction picks the least
+    recently hit entries without scanning the folder. Files are written to a
+    temporary name and renamed into place, so a crash never leaves a
+    truncated entry behind. The index is shared safely by every worker
+    process on the machine.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(folder, exist_ok=True)
+
+        with self._connection() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_hit REAL NOT NULL
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_last_hit ON entries (last_hit)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            created = db.execute("INSERT OR IGNORE INTO meta VALUES ('total_bytes', 0)").rowcount
+
+        # A new index adopts the cache files written before it existed
+        if created:
+            self._import_existing()
+
+    def _connection(self):
+        """Get this thread's connection to the index."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.folder, INDEX_FILENAME), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _import_existing(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((entry.name[:-5], stat.st_size, stat.st_mtime, stat.st_mtime))
+        with self._connection() as db:
+            db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)", entries)
+            db.execute("UPDATE meta SET value = (SELECT COALESCE(SUM(size), 0) FROM entries) WHERE name = 'total_bytes'")
+        logger.info(f"Indexed {len(entries)} existing cache entries")
+
+    def _remove(self, db, key, size):
+        """Delete an entry's file and index row inside an open transaction."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        deleted = db.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+        if deleted:
+            db.execute("UPDATE meta SET value = value - ? WHERE name = 'total_bytes'", (size,))
+
+    def get(self, key):
+        """
+        Get cached results.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            dict: The cached results, or None on a miss. Unreadable entries are
+            removed and reported as a miss.
+        """
+        db = self._connection()
+        row = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        try:
+            with open(self._path(key), 'r') as f:
+                results = json.load(f)
+        except Exception as e:
+            logger.error(f"Removing unreadable cache entry {key}: {str(e)}")
+            with db:
+                self._remove(db, key, row[0])
+            return None
+
+        with db:
+            db.execute("UPDATE entries SET last_hit = ? WHERE key = ?", (time.time(), key))
+        return results
+
+    def put(self, key, results):
+        """Store results atomically, evicting old entries if the cache is over budget."""
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(results, f)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        now = time.time()
+        db = self._connection()
+        with db:
+            row = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            previous = row[0] if row else 0
+            db.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_hit = excluded.last_hit",
+                (key, size, now, now)
+            )
+            db.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (size - previous,))
+        self._evict()
+
+    def _total_bytes(self, db):
+        return db.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self):
+        """Remove the least recently hit entries until the cache fits its budget."""
+        db = self._connection()
+        evicted = 0
+        while self._total_bytes(db) > self.max_bytes:
+            with db:
+                rows = db.execute(
+                    "SELECT key, size FROM entries ORDER BY last_hit LIMIT ?", (EVICTION_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    self._remove(db, key, size)
+                    evicted += 1
+                    if self._total_bytes(db) <= self.max_bytes:
+                        break
+        if evicted:
+            logger.info(f"Evicted {evicted} cache entries")
+
+    def purge(self, key=None):
+        """
+        Remove one entry, or every entry if no key is given.
+
+        Returns:
+            int: Number of entries removed
+        """
+        db = self._connection()
+        with db:
+            if key is not None:
+                row = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return 0
+                self._remove(db, key, row[0])
+                return 1
+            rows = db.execute("SELECT key, size FROM entries").fetchall()
+            for entry_key, size in rows:
+                self._remove(db, entry_key, size)
+            return len(rows)
+
+    def stats(self):
+        """Get the number of entries, their total size and the budget."""
+        db = self._connection()
+        count, oldest_hit = db.execute("SELECT COUNT(*), MIN(last_hit) FROM entries").fetchone()
+        return {
+            "entries": count,
+            "total_bytes": self._total_bytes(db),
+            "max_bytes": self.max_bytes,
+            "oldest_hit": oldest_hit
+        }
@@ -0,0 +1,128 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from clients import get_embedding_model
+from gemini_integration import split_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum characters per retrievable chunk of notes or transcript
+RETRIEVAL_CHUNK_CHARS = int(os.environ.get("RETRIEVAL_CHUNK_CHARS", 1200))
+
+# Number of chunks injected into each chat turn
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", 4))
+
+# Number of per-task indexes kept in memory
+RETRIEVAL_MAX_INDEXES = int(os.environ.get("RETRIEVAL_MAX_INDEXES", 100))
+
+
+class TaskIndex:
+    """Chunks of a task's study material with their normalized embeddings."""
+
+    def __init__(self, chunks, embeddings):
+        self.chunks = chunks
+        self.embeddings = embeddings
+
+    def search(self, query_embedding, k):
+        """
+        Find the chunks most similar to a query.
+
+        Args:
+            query_embedding (np.ndarray): Normalized embedding of the query
+            k (int): Number of chunks to return
+
+        Returns:
+            list: Up to k chunks, in the order they appear in the material
+        """
+        if not self.chunks:
+            return []
+        scores = self.embeddings @ query_embedding
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.chunks[i] for i in sorted(top)]
+
+
+def chunk_material(notes, transcript=""):
+    """Split notes and transcript into labelled retrieval chunks."""
+    chunks = []
+    for label, text in (("Notes", notes), ("Transcript", transcript)):
+        if not text:
+            continue
+        for chunk in split_text(text, RETRIEVAL_CHUNK_CHARS):
+            if chunk.strip():
+                chunks.append(f"[{label}] {chunk.strip()}")
+    return chunks
+
+
+def build_index(notes, transcript=""):
+    """Embed a task's notes and transcript into a TaskIndex."""
+    chunks = chunk_material(notes, transcript)
+    if not chunks:
+        return TaskIndex([], np.zeros((0, 0), dtype=np.float32))
+    embeddings = get_embedding_model().encode(chunks, normalize_embeddings=True, convert_to_numpy=True)
+    return TaskIndex(chunks, embeddings.astype(np.float32))
+
+
+def material_fingerprint(notes, transcript=""):
+    """Hash of the material an index was built from, so rewritten notes are noticed."""
+    return hashlib.sha256(f"{notes}\0{transcript}".encode()).hexdigest()
+
+
+# Per-task (fingerprint, index) pairs, least recently used first
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(task_id, notes, transcript=""):
+    """
+    Get a task's index, building it on first use and evicting the least recently used.
+
+    An index built from other notes or another transcript, e.g. before the
+    notes were regenerated in another process, is rebuilt.
+    """
+    fingerprint = material_fingerprint(notes, transcript)
+    with _lock:
+        entry = _indexes.get(task_id)
+        if entry is not None and entry[0] == fingerprint:
+            _indexes.move_to_end(task_id)
+            return entry[1]
+
+    index = build_index(notes, transcript)
+    logger.info(f"Built retrieval index for task {task_id} with {len(index.chunks)} chunks")
+
+    with _lock:
+        _indexes[task_id] = (fingerprint, index)
+        _indexes.move_to_end(task_id)
+        while len(_indexes) > RETRIEVAL_MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieve(task_id, notes, transcript, question, k=None):
+    """
+    Get the chunks of a task's material most relevant to a question.
+
+    Args:
+        task_id (str): ID of the task the material belongs to
+        notes (str): Generated notes
+        transcript (str): Transcript text
+        question (str): The student's question
+        k (int): Number of chunks, defaults to RETRIEVAL_TOP_K
+
+    Returns:
+        list: Relevant chunks in document order
+    """
+    index = get_index(task_id, notes, transcript)
+    query_embedding = get_embedding_model().encode(question, normalize_embeddings=True, convert_to_numpy=True)
+    return index.search(query_embedding.astype(np.float32), k or RETRIEVAL_TOP_K)
+
+
+def drop_index(task_id):
+    """Remove a task's index from memory, e.g. once its notes are rewritten."""
+    with _lock:
+        _indexes.pop(task_id, None)
@@ -0,0 +1,239 @@
+import os
+import json
+import fcntl
+import logging
+import threading
+from array import array
+import numpy as np
+from clients import get_embedding_model
+from gemini_integration import split_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory holding the vector file, the passage map and the lock file
+SEARCH_INDEX_FOLDER = os.environ.get("SEARCH_INDEX_FOLDER", "search_index")
+
+# Maximum characters per indexed passage
+SEARCH_CHUNK_CHARS = int(os.environ.get("SEARCH_CHUNK_CHARS", 1200))
+
+# Number of passages returned by a search, and the most a client may ask for
+SEARCH_TOP_K = int(os.environ.get("SEARCH_TOP_K", 20))
+SEARCH_MAX_K = int(os.environ.get("SEARCH_MAX_K", 100))
+
+# Rows the brute-force scan serves well under 100 ms with vectors in the page cache:
+# about 300 MB of 384-dimension vectors, or some 3,000 lectures of ~60 passages
+SEARCH_SCAN_ROWS = int(os.environ.get("SEARCH_SCAN_ROWS", 200000))
+
+
+class SearchIndex:
+    """
+    Append-only embedding index over the passages of every processed task.
+
+    Normalized float32 vectors are appended to a flat file that searches
+    memory-map, so a query is a single matrix-vector product. Row i of the
+    vector file belongs to line i of a JSONL passage file holding the task
+    ID, source and text; each task's file_info is written once to a JSONL
+    task file. Memory only holds the byte offset of every passage line and
+    of every task line: the texts and file_info of the top passages are read
+    from disk per query. Writers from any worker process serialize on a file
+    lock; readers only pick up rows present in both files, so they never
+    need the lock.
+
+    The scan is exact and linear in the number of rows. It stays well under
+    100 ms up to about SEARCH_SCAN_ROWS passages; a larger corpus needs an
+    approximate nearest-neighbour index instead.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.vectors_path = os.path.join(folder, "vectors.f32")
+        self.passages_path = os.path.join(folder, "passages.jsonl")
+        self.tasks_path = os.path.join(folder, "tasks.jsonl")
+        self.lock_path = os.path.join(folder, "index.lock")
+        os.makedirs(folder, exist_ok=True)
+        for path in (self.vectors_path, self.passages_path, self.tasks_path):
+            open(path, "ab").close()
+
+        self._dimension = None
+        # Byte offset of each passage line, indexed by vector row
+        self._row_offsets = array("q")
+        self._passages_offset = 0
+        # Byte offset of each task's line in the task file; tasks indexed before the
+        # task file existed have none, and their passages carry their file_info
+        self._task_offsets = {}
+        self._tasks_offset = 0
+        self._task_ids = set()
+        self._vectors = None
+        self._scan_warned = False
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self):
+        if self._dimension is None:
+            self._dimension = get_embedding_model().get_sentence_embedding_dimension()
+        return self._dimension
+
+    @staticmethod
+    def _read_lines(path, offset):
+        """Read the complete lines appended to a file since offset, with their offsets."""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # A trailing line without a newline is still being written
+        complete = data[:data.rfind(b"\n") + 1]
+        lines = []
+        for line in complete.splitlines(keepends=True):
+            lines.append((offset, line))
+            offset += len(line)
+        return lines, offset
+
+    def _refresh(self):
+        """Index passage and task lines and map vectors appended since the last call, under self._lock."""
+        lines, self._tasks_offset = self._read_lines(self.tasks_path, self._tasks_offset)
+        for offset, line in lines:
+            self._task_offsets[json.loads(line)["task_id"]] = offset
+
+        lines, self._passages_offset = self._read_lines(self.passages_path, self._passages_offset)
+        for offset, line in lines:
+            self._row_offsets.append(offset)
+            self._task_ids.add(json.loads(line)["task_id"])
+
+        row_bytes = self.dimension * 4
+        rows = min(os.path.getsize(self.vectors_path) // row_bytes, len(self._row_offsets))
+        if rows and (self._vectors is None or self._vectors.shape[0] != rows):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+            if rows > SEARCH_SCAN_ROWS and not self._scan_warned:
+                self._scan_warned = True
+                logger.warning(f"Search index has {rows} passages, more than the brute-force scan serves quickly")
+
+    def contains(self, task_id):
+        """Whether a task's passages are already indexed."""
+        with self._lock:
+            self._refresh()
+            return task_id in self._task_ids
+
+    def add_task(self, task_id, file_info, notes, transcript=""):
+        """
+        Embed and append the passages of a completed task.
+
+        Args:
+            task_id (str): ID of the task
+            file_info (dict): File or URL details returned with search results
+            notes (str): Generated notes
+            transcript (str): Transcript text
+
+        Returns:
+            int: Number of passages added, 0 if the task was already indexed
+        """
+        if self.contains(task_id):
+            return 0
+
+        passages = []
+        for source, text in (("notes", notes), ("transcript", transcript)):
+            for chunk in split_text(text or "", SEARCH_CHUNK_CHARS):
+                if chunk.strip():
+                    passages.append({"task_id": task_id, "source": source, "text": chunk.strip()})
+        if not passages:
+            return 0
+
+        embeddings = get_embedding_model().encode(
+            [passage["text"] for passage in passages], normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with self._lock:
+                    self._refresh()
+                    if task_id in self._task_ids:
+                        return 0
+                    # Drop any half-written rows left by a writer that crashed
+                    row_count = len(self._row_offsets)
+                    with open(self.passages_path, "r+b") as f:
+                        f.truncate(self._passages_offset)
+                    with open(self.tasks_path, "r+b") as f:
+                        f.truncate(self._tasks_offset)
+                    with open(self.vectors_path, "r+b") as f:
+                        f.truncate(row_count * self.dimension * 4)
+
+                    # The task line goes first so a passage never lacks its file_info; a task
+                    # only counts as indexed once its passages are written
+                    with open(self.tasks_path, "ab") as f:
+                        f.write((json.dumps({"task_id": task_id, "file_info": file_info}) + "\n").encode())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    with open(self.vectors_path, "ab") as f:
+                        f.write(embeddings.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    with open(self.passages_path, "ab") as f:
+                        f.write("".join(json.dumps(passage) + "\n" for passage in passages).encode())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        logger.info(f"Indexed {len(passages)} passages for task {task_id}")
+        return len(passages)
+
+    def search(self, query, k=None):
+        """
+        Find the passages most similar to a query, grouped by task.
+
+        Args:
+            query (str): Search text
+            k (int): Number of passages to consider, defaults to SEARCH_TOP_K
+
+        Returns:
+            list: Tasks ordered by their best passage score, each with its
+            file_info, score and matching passages
+        """
+        query_embedding = get_embedding_model().encode(
+            query, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+        with self._lock:
+            self._refresh()
+            vectors = self._vectors
+            if vectors is None:
+                return []
+            row_offsets = self._row_offsets
+            task_offsets = self._task_offsets
+
+        scores = vectors @ query_embedding
+        k = min(k or SEARCH_TOP_K, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        tasks = {}
+        with open(self.passages_path, "rb") as passages_file, open(self.tasks_path, "rb") as tasks_file:
+            for row in top:
+                passages_file.seek(row_offsets[row])
+                passage = json.loads(passages_file.readline())
+                score = float(scores[row])
+                task = tasks.get(passage["task_id"])
+                if task is None:
+                    file_info = passage.get("file_info")
+                    task_offset = task_offsets.get(passage["task_id"])
+                    if task_offset is not None:
+                        tasks_file.seek(task_offset)
+                        file_info = json.loads(tasks_file.readline())["file_info"]
+                    task = tasks[passage["task_id"]] = {
+                        "task_id": passage["task_id"],
+                        "file_info": file_info or {},
+                        "score": score,
+                        "passages": []
+                    }
+                task["passages"].append({"source": passage["source"], "text": passage["text"], "score": score})
+        return list(tasks.values())
+
+    def stats(self):
+        """Get the number of indexed passages and tasks."""
+        with self._lock:
+            self._refresh()
+            return {"passages": len(self._row_offsets), "tasks": len(self._task_ids)}
+
+
+search_index = SearchIndex(SEARCH_INDEX_FOLDER)
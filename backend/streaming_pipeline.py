@@ -0,0 +1,265 @@
+import os
+import wave
+import tempfile
+import logging
+import threading
+import subprocess
+from google_speech import (
+    Transcription, submit_segment, STT_SEGMENT_SECONDS, STT_OVERLAP_SECONDS
+)
+from media_tools import FFMPEG_BINARY, read_stderr_tail
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 16 kHz mono 16-bit PCM
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+# Bytes of decoded audio read from ffmpeg at a time
+PCM_READ_SIZE = 64 * 1024
+
+# Maximum uploads decoded while they stream in, across all requests; each holds an
+# ffmpeg process and feeds transcription outside the job scheduler's media pool
+STREAM_MAX_EXTRACTORS = int(os.environ.get("STREAM_MAX_EXTRACTORS", 2))
+_extractor_slots = threading.BoundedSemaphore(STREAM_MAX_EXTRACTORS)
+
+
+def reserve_extractor():
+    """
+    Reserve a slot for a StreamingExtractor without waiting.
+
+    Returns:
+        bool: False if STREAM_MAX_EXTRACTORS uploads are already being decoded.
+        A reserved slot passes to the extractor built with it, or must be
+        given back with release_extractor()
+    """
+    return _extractor_slots.acquire(blocking=False)
+
+
+def release_extractor():
+    """Give back a slot reserved with reserve_extractor()."""
+    _extractor_slots.release()
+
+
+def _box_types(head):
+    """Yield the top-level box types of an MP4/MOV header, as far as head reaches."""
+    position = 0
+    while position + 8 <= len(head):
+        size = int.from_bytes(head[position:position + 4], "big")
+        box_type = head[position + 4:position + 8]
+        yield box_type
+        if size == 1 and position + 16 <= len(head):
+            size = int.from_bytes(head[position + 8:position + 16], "big")
+        if size < 8:
+            return
+        position += size
+
+
+def is_streamable(head):
+    """
+    Whether a container can be demuxed while it is still arriving.
+
+    MP4/MOV files can only be read front to back when their index (moov box)
+    comes before the media data; files written with the index at the end
+    need the whole file. Other containers are streamed.
+
+    Args:
+        head (bytes): The first bytes of the upload
+    """
+    if head[4:8] != b"ftyp":
+        return True
+    for box_type in _box_types(head):
+        if box_type == b"moov":
+            return True
+        if box_type == b"mdat":
+            return False
+    return False
+
+
+def _write_wav(path, pcm):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm)
+
+
+class StreamingExtractor:
+    """
+    Demuxes an upload as it arrives and transcribes its audio segment by segment.
+
+    Upload bytes are fed to an ffmpeg process decoding the audio track to
+    16 kHz mono PCM. A reader thread appends the PCM to a WAV file and, as
+    soon as enough audio has arrived, cuts overlapping segments (the same
+    lengths and overlap as file transcription) and submits them for
+    recognition. When the input ends, the final segment is submitted and the
+    transcription closes; its on_complete receives the transcript.
+
+    Each extractor must be given a slot from reserve_extractor(); it is
+    released once ffmpeg has exited.
+    """
+
+    def __init__(self, audio_path, on_complete, on_failure, language_code="en-US", bucket_name="your-bucket-name"):
+        """
+        Args:
+            audio_path (str): Path of the WAV file the full audio is written to
+            on_complete (callable): Receives the transcript dictionary
+            on_failure (callable): Called if decoding fails after finish() was
+                called; failures before that are reported by feed() and finish()
+            language_code (str): Language code for transcription
+            bucket_name (str): Name of the GCS bucket to store audio files
+        """
+        self.audio_path = audio_path
+        self.segment_dir = tempfile.mkdtemp(prefix="stream_")
+        self.on_failure = on_failure
+        self.language_code = language_code
+        self.bucket_name = bucket_name
+        self.transcription = Transcription(on_complete)
+        self._failed = False
+        self._input_done = False
+        self._lock = threading.Lock()
+
+        # Errors go to a file rather than a pipe: once a pipe buffer of decode errors
+        # was unread, ffmpeg would stop reading the upload and block feed()
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(
+                [FFMPEG_BINARY, "-v", "error", "-i", "pipe:0", "-vn", "-sn", "-dn",
+                 "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-c:a", "pcm_s16le", "pipe:1"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr
+            )
+        except Exception:
+            self._stderr.close()
+            release_extractor()
+            raise
+        self._reader = threading.Thread(target=self._read_audio, name="stream-extract", daemon=True)
+        self._reader.start()
+
+    @property
+    def failed(self):
+        with self._lock:
+            return self._failed
+
+    def feed(self, chunk):
+        """
+        Pass upload bytes to ffmpeg.
+
+        Returns:
+            bool: False once decoding has failed and the upload should be
+            processed from the saved file instead
+        """
+        if self.failed:
+            return False
+        try:
+            self._process.stdin.write(chunk)
+            return True
+        except (BrokenPipeError, ValueError):
+            self._fail("ffmpeg stopped reading the upload")
+            return False
+
+    def finish(self):
+        """
+        Mark the end of the upload.
+
+        Returns:
+            bool: True if decoding is still healthy; later failures are
+            reported through on_failure
+        """
+        with self._lock:
+            self._input_done = True
+            failed = self._failed
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return not failed
+
+    def cancel(self):
+        """Stop decoding and drop the transcription, e.g. when the upload hits the cache."""
+        self.transcription.cancel()
+        with self._lock:
+            self._failed = True
+        if self._process.poll() is None:
+            self._process.kill()
+
+    def _fail(self, reason):
+        with self._lock:
+            if self._failed:
+                return
+            self._failed = True
+            notify = self._input_done
+        logger.error(f"Streaming extraction of {self.audio_path} failed: {reason}")
+        self.transcription.cancel()
+        if self._process.poll() is None:
+            self._process.kill()
+        if notify:
+            self.on_failure()
+
+    def _submit(self, pcm, offset):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        segment_path = os.path.join(self.segment_dir, f"segment_{int(offset):06d}.wav")
+        _write_wav(segment_path, pcm)
+        future = submit_segment(
+            self.transcription, segment_path, offset, len(pcm) / BYTES_PER_SECOND,
+            self.language_code, self.bucket_name
+        )
+        future.add_done_callback(lambda _: self._remove_segment(segment_path))
+
+    def _remove_segment(self, segment_path):
+        """Delete a submitted segment, and the segment folder once it is empty."""
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+        try:
+            os.rmdir(self.segment_dir)
+        except OSError:
+            pass
+
+    def _read_audio(self):
+        segment_bytes = int(STT_SEGMENT_SECONDS * BYTES_PER_SECOND) & ~1
+        window_bytes = int((STT_SEGMENT_SECONDS + STT_OVERLAP_SECONDS) * BYTES_PER_SECOND) & ~1
+        overlap_bytes = window_bytes - segment_bytes
+        buffer = bytearray()
+        buffer_offset = 0
+        total_bytes = 0
+
+        try:
+            with wave.open(self.audio_path, "wb") as audio_file:
+                audio_file.setnchannels(1)
+                audio_file.setsampwidth(2)
+                audio_file.setframerate(SAMPLE_RATE)
+
+                while True:
+                    pcm = self._process.stdout.read(PCM_READ_SIZE)
+                    if not pcm:
+                        break
+                    audio_file.writeframes(pcm)
+                    buffer.extend(pcm)
+                    total_bytes += len(pcm)
+
+                    # Submit every full segment as soon as its overlap has arrived too
+                    while len(buffer) >= window_bytes and not self.failed:
+                        self._submit(bytes(buffer[:window_bytes]), buffer_offset / BYTES_PER_SECOND)
+                        del buffer[:segment_bytes]
+                        buffer_offset += segment_bytes
+
+            if self._process.wait() != 0:
+                self._fail(read_stderr_tail(self._stderr).strip() or f"ffmpeg exited with {self._process.returncode}")
+                return
+            if self.failed:
+                return
+
+            # The tail is already covered by the previous segment's overlap unless it is longer
+            if len(buffer) > (overlap_bytes if buffer_offset else 0):
+                self._submit(bytes(buffer), buffer_offset / BYTES_PER_SECOND)
+            self.transcription.mark("input")
+            self.transcription.close(total_bytes / BYTES_PER_SECOND)
+            logger.info(f"Streamed {total_bytes / BYTES_PER_SECOND:.0f}s of audio from upload")
+        except Exception as e:
+            self._fail(str(e))
+        finally:
+            self._process.stdout.close()
+            self._process.wait()
+            self._stderr.close()
+            release_extractor()
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often pending Speech-to-Text operations are checked
+STT_POLL_SECONDS = float(os.environ.get("STT_POLL_SECONDS", 5))
+
+# Threads running completion callbacks, so a slow callback never delays polling
+STT_CALLBACK_WORKERS = int(os.environ.get("STT_CALLBACK_WORKERS", 2))
+
+
+class OperationPoller:
+    """
+    Tracks long-running operations on a single background thread.
+
+    Instead of a worker thread blocking in operation.result() for each
+    recognition, operations are registered with a callback and checked every
+    interval; the callback runs once the operation finishes, fails or passes
+    its deadline. Hundreds of pending operations cost one polling thread.
+    """
+
+    def __init__(self, interval, callback_workers):
+        self.interval = interval
+        self._operations = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._callbacks = ThreadPoolExecutor(max_workers=callback_workers, thread_name_prefix="stt-callback")
+
+    def watch(self, operation, on_done, timeout):
+        """
+        Call on_done(response, error) once an operation completes.
+
+        Args:
+            operation: A google.api_core operation
+            on_done (callable): Receives the response, or None and the exception
+            timeout (float): Seconds before the operation is given up on
+        """
+        with self._lock:
+            self._operations[next(self._ids)] = (operation, on_done, time.time() + timeout)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stt-poller", daemon=True)
+                self._thread.start()
+
+    def _check(self, operation, deadline):
+        """
+        Returns:
+            tuple: (finished, response, error)
+        """
+        try:
+            # done() refreshes the operation with one GetOperation call
+            if operation.done():
+                error = operation.exception()
+                return True, None if error else operation.result(), error
+        except Exception as e:
+            # Transient polling errors are retried until the deadline
+            logger.warning(f"Error polling operation: {str(e)}")
+        if time.time() > deadline:
+            return True, None, TimeoutError("Speech-to-Text operation timed out")
+        return False, None, None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                pending = list(self._operations.items())
+            for operation_id, (operation, on_done, deadline) in pending:
+                finished, response, error = self._check(operation, deadline)
+                if not finished:
+                    continue
+                with self._lock:
+                    del self._operations[operation_id]
+                self._callbacks.submit(self._callback, on_done, response, error)
+
+    def _callback(self, on_done, response, error):
+        try:
+            on_done(response, error)
+        except Exception as e:
+            logger.error(f"Error in operation callback: {str(e)}", exc_info=True)
+
+    def stats(self):
+        """Get the number of operations being tracked."""
+        with self._lock:
+            return {"pending_operations": len(self._operations), "poll_seconds": self.interval}
+
+
+stt_poller = OperationPoller(STT_POLL_SECONDS, STT_CALLBACK_WORKERS)
@@ -0,0 +1,223 @@
+import os
+import copy
+import logging
+import threading
+from datetime import datetime, timezone
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Which backend holds task state: "mongo" (shared by all worker processes) or "memory"
+TASK_STORE_BACKEND = os.environ.get("TASK_STORE", "mongo")
+
+# How long finished or abandoned tasks are kept in Mongo before expiring
+TASK_TTL_SECONDS = int(os.environ.get("TASK_TTL_SECONDS", 7 * 24 * 3600))
+
+
+class InMemoryTaskStore:
+    """
+    Task state kept in a process-local dict.
+
+    Only suitable for tests and single-process development servers, since
+    other worker processes cannot see the tasks.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id, fields):
+        """Create or replace a task document."""
+        with self._lock:
+            self._tasks[task_id] = copy.deepcopy(fields)
+
+    def get(self, task_id, fields=None):
+        """
+        Get a copy of a task document, or None if it does not exist.
+
+        Args:
+            task_id (str): ID of the task
+            fields (list): Top-level fields to return, all fields if None
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            if fields is not None:
+                task = {key: value for key, value in task.items() if key in fields}
+            return copy.deepcopy(task)
+
+    def update(self, task_id, fields):
+        """
+        Set fields on an existing task.
+
+        Args:
+            task_id (str): ID of the task to update
+            fields (dict): Field values, keys may use dotted paths such as "results.quiz"
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                logger.warning(f"Update for unknown task: {task_id}")
+                return
+            for path, value in fields.items():
+                target = task
+                keys = path.split(".")
+                for key in keys[:-1]:
+                    target = target.setdefault(key, {})
+                target[keys[-1]] = copy.deepcopy(value)
+
+    def claim(self, task_id, field, expected, value):
+        """
+        Set a top-level field only if it still holds an expected value.
+
+        Args:
+            task_id (str): ID of the task to update
+            field (str): Top-level field to compare and set
+            expected: Value the field must hold, None also matching a missing field
+            value: Value to set
+
+        Returns:
+            bool: True if this call set the field, False if the task is gone or the field changed
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task.get(field) != expected:
+                return False
+            task[field] = copy.deepcopy(value)
+            return True
+
+    def delete(self, task_id):
+        """Remove a task document."""
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def count_live(self, field, now):
+        """Count the tasks whose field is an entry with an expires_at timestamp after now."""
+        with self._lock:
+            return sum(1 for task in self._tasks.values() if (task.get(field) or {}).get("expires_at", 0) > now)
+
+    def entries(self, field):
+        """Get every entry with an expires_at timestamp held in field, keyed by task ID."""
+        with self._lock:
+            return {
+                task_id: copy.deepcopy(task[field])
+                for task_id, task in self._tasks.items()
+                if "expires_at" in (task.get(field) or {})
+            }
+
+    def all(self):
+        """Get copies of all task documents keyed by task ID."""
+        with self._lock:
+            return copy.deepcopy(self._tasks)
+
+
+class MongoTaskStore:
+    """Task state kept in a Mongo collection so every worker process shares it."""
+
+    def __init__(self, collection, expiring_fields=()):
+        self._collection = collection
+        try:
+            self._collection.create_index("updated_at", expireAfterSeconds=TASK_TTL_SECONDS)
+            # Only the few tasks holding an entry are indexed, so counting them stays cheap
+            for field in expiring_fields:
+                path = f"{field}.expires_at"
+                self._collection.create_index(path, partialFilterExpression={path: {"$exists": True}})
+        except Exception as e:
+            logger.error(f"Error creating task indexes: {str(e)}")
+
+    def create(self, task_id, fields):
+        """Create or replace a task document."""
+        document = dict(fields, updated_at=datetime.now(timezone.utc))
+        self._collection.replace_one({"_id": task_id}, document, upsert=True)
+
+    def get(self, task_id, fields=None):
+        """
+        Get a task document, or None if it does not exist.
+
+        Args:
+            task_id (str): ID of the task
+            fields (list): Top-level fields to return, all fields if None
+        """
+        if fields is not None:
+            projection = dict({field: 1 for field in fields}, _id=0)
+        else:
+            projection = {"_id": 0, "updated_at": 0}
+        return self._collection.find_one({"_id": task_id}, projection)
+
+    def update(self, task_id, fields):
+        """
+        Set fields on an existing task.
+
+        Args:
+            task_id (str): ID of the task to update
+            fields (dict): Field values, keys may use dotted paths such as "results.quiz"
+        """
+        document = dict(fields, updated_at=datetime.now(timezone.utc))
+        result = self._collection.update_one({"_id": task_id}, {"$set": document})
+        if result.matched_count == 0:
+            logger.warning(f"Update for unknown task: {task_id}")
+
+    def claim(self, task_id, field, expected, value):
+        """
+        Set a top-level field only if it still holds an expected value.
+
+        Args:
+            task_id (str): ID of the task to update
+            field (str): Top-level field to compare and set
+            expected: Value the field must hold, None also matching a missing field
+            value: Value to set
+
+        Returns:
+            bool: True if this call set the field, False if the task is gone or the field changed
+        """
+        result = self._collection.update_one(
+            {"_id": task_id, field: expected},
+            {"$set": {field: value, "updated_at": datetime.now(timezone.utc)}}
+        )
+        return result.matched_count == 1
+
+    def delete(self, task_id):
+        """Remove a task document."""
+        self._collection.delete_one({"_id": task_id})
+
+    def count_live(self, field, now):
+        """Count the tasks whose field is an entry with an expires_at timestamp after now."""
+        return self._collection.count_documents({f"{field}.expires_at": {"$gt": now}})
+
+    def entries(self, field):
+        """Get every entry with an expires_at timestamp held in field, keyed by task ID."""
+        return {
+            document["_id"]: document[field]
+            for document in self._collection.find({f"{field}.expires_at": {"$exists": True}}, {field: 1})
+        }
+
+    def all(self):
+        """Get all task documents keyed by task ID."""
+        return {
+            document.pop("_id"): document
+            for document in self._collection.find({}, {"updated_at": 0})
+        }
+
+
+def create_task_store(collection, backend=TASK_STORE_BACKEND, expiring_fields=()):
+    """
+    Create the configured task store.
+
+    Args:
+        collection: Mongo collection used by the "mongo" backend
+        backend (str): "mongo" or "memory"
+        expiring_fields (list): Fields holding entries with an expires_at timestamp,
+            indexed for count_live and entries
+
+    Returns:
+        A task store exposing create/get/update/delete/count_live/entries/all
+    """
+    if backend == "memory":
+        logger.info("Using in-memory task store")
+        return InMemoryTaskStore()
+    if backend == "mongo":
+        logger.info(f"Using Mongo task store ({collection.name})")
+        return MongoTaskStore(collection, expiring_fields)
+    raise ValueError(f"Unknown task store backend: {backend}")
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from dag_executor import Node, DagCancelled, DagError, run_dag
+
+
+def test_nodes_receive_their_dependencies():
+    nodes = [
+        Node("double", lambda deps: deps["x"] * 2, ["x"]),
+        Node("add", lambda deps: deps["double"] + deps["x"], ["double", "x"])
+    ]
+    assert run_dag(nodes, {"x": 3}) == {"double": 6, "add": 9}
+
+
+def test_independent_nodes_run_concurrently():
+    # Both nodes must be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    nodes = [
+        Node("a", lambda deps: barrier.wait() is not None, ["x"]),
+        Node("b", lambda deps: barrier.wait() is not None, ["x"])
+    ]
+    assert run_dag(nodes, {"x": 1}) == {"a": True, "b": True}
+
+
+def test_done_nodes_are_not_rerun():
+    calls = []
+    nodes = [
+        Node("a", lambda deps: calls.append("a") or 1),
+        Node("b", lambda deps: deps["a"] + 1, ["a"])
+    ]
+    assert run_dag(nodes, {}, done={"a": 10}) == {"a": 10, "b": 11}
+    assert calls == []
+
+
+def test_required_failure_skips_dependents_and_raises():
+    statuses = {}
+
+    def fail(deps):
+        raise RuntimeError("boom")
+
+    nodes = [
+        Node("a", fail),
+        Node("b", lambda deps: 1, ["a"]),
+        Node("c", lambda deps: 2)
+    ]
+    with pytest.raises(DagError) as excinfo:
+        run_dag(nodes, {}, on_status=lambda name, status, result: statuses.__setitem__(name, status))
+    assert excinfo.value.node == "a"
+    assert statuses == {"a": "error", "b": "skipped", "c": "completed"}
+
+
+def test_optional_failure_keeps_other_results():
+    def fail(deps):
+        raise RuntimeError("boom")
+
+    nodes = [Node("a", fail, required=False), Node("b", lambda deps: 2)]
+    assert run_dag(nodes, {}) == {"b": 2}
+
+
+def test_failing_status_hook_does_not_stall_the_graph():
+    def on_status(name, status, result):
+        raise RuntimeError("store unavailable")
+
+    assert run_dag([Node("a", lambda deps: 1)], {}, on_status=on_status) == {"a": 1}
+
+
+def test_cancel_skips_nodes_not_started():
+    calls = []
+    nodes = [
+        Node("a", lambda deps: calls.append("a")),
+        Node("b", lambda deps: calls.append("b"), ["a"])
+    ]
+    with pytest.raises(DagCancelled):
+        run_dag(nodes, {}, should_cancel=lambda: True)
+    assert calls == []
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        run_dag([Node("a", lambda deps: 1, ["missing"])], {})
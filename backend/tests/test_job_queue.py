@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from job_queue import JobScheduler, QueueFullError
+
+
+def test_submit_rejects_jobs_beyond_the_bound_but_accepts_handoffs():
+    release = threading.Event()
+    scheduler = JobScheduler({"io": 1}, max_queued=1)
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    try:
+        scheduler.submit("io", "running", block)
+        assert started.wait(5)
+        scheduler.submit("io", "queued", block)
+        with pytest.raises(QueueFullError) as excinfo:
+            scheduler.submit("io", "rejected", block)
+        assert excinfo.value.retry_after >= 1
+        scheduler.handoff("io", "admitted", block)
+    finally:
+        release.set()
+
+
+def test_submit_counts_jobs_queued_by_every_process():
+    scheduler = JobScheduler({"io": 1}, max_queued=3)
+    scheduler.share_queue(lambda task_id, position: None, lambda: 3)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("io", "t", lambda: None)
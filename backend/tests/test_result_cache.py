@@ -0,0 +1,27 @@
+from result_cache import ResultCache
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10_000)
+    cache.put("a", {"notes": "hi"})
+    assert cache.get("a") == {"notes": "hi"}
+    assert cache.get("missing") is None
+
+
+def test_least_recently_hit_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=250)
+    cache.put("old", {"notes": "x" * 100})
+    cache.put("hit", {"notes": "y" * 100})
+    cache.get("hit")
+    cache.put("new", {"notes": "z" * 100})
+    assert cache.get("old") is None
+    assert cache.get("hit") is not None
+    assert cache.get("new") is not None
+
+
+def test_unreadable_entries_are_dropped(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10_000)
+    cache.put("a", {"notes": "hi"})
+    (tmp_path / "a.json").write_text("{not json")
+    assert cache.get("a") is None
+    assert cache.purge("a") == 0
@@ -0,0 +1,26 @@
+import pytest
+
+# Imports the Gemini client libraries, so only runs where they are installed
+gemini_integration = pytest.importorskip("gemini_integration")
+split_text = gemini_integration.split_text
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("Short text.", 500) == ["Short text."]
+
+
+def test_sections_are_packed_up_to_the_limit():
+    text = "\n\n".join(["a" * 200, "b" * 200, "c" * 200])
+    assert split_text(text, 500) == ["a" * 200 + "\n\n" + "b" * 200, "c" * 200]
+
+
+def test_words_longer_than_a_chunk_are_cut():
+    chunks = split_text("a" * 1200, 500)
+    assert [len(chunk) for chunk in chunks] == [500, 500, 200]
+
+
+def test_cjk_sentences_split_without_spaces():
+    text = "这是第一句。这是第二句！" * 100
+    chunks = split_text(text, 500)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert "".join(chunks) == text
@@ -0,0 +1,33 @@
+from task_store import InMemoryTaskStore
+
+
+def test_update_sets_dotted_paths():
+    store = InMemoryTaskStore()
+    store.create("t", {"status": "uploaded"})
+    store.update("t", {"checkpoints.transcript": {"text": "hi"}, "status": "summarizing"})
+    assert store.get("t") == {"status": "summarizing", "checkpoints": {"transcript": {"text": "hi"}}}
+    assert store.get("t", fields=["status"]) == {"status": "summarizing"}
+
+
+def test_get_returns_a_copy():
+    store = InMemoryTaskStore()
+    store.create("t", {"results": {"quiz": []}})
+    store.get("t")["results"]["quiz"].append("changed")
+    assert store.get("t")["results"]["quiz"] == []
+
+
+def test_claim_succeeds_only_once():
+    store = InMemoryTaskStore()
+    store.create("u", {"size": 1})
+    assert store.claim("u", "state", None, "finalizing")
+    assert not store.claim("u", "state", None, "finalizing")
+    assert not store.claim("missing", "state", None, "finalizing")
+
+
+def test_count_live_ignores_expired_entries():
+    store = InMemoryTaskStore()
+    store.create("live", {"queue": {"position": 1, "expires_at": 200}})
+    store.create("stale", {"queue": {"position": 2, "expires_at": 50}})
+    store.create("idle", {"status": "completed"})
+    assert store.count_live("queue", now=100) == 1
+    assert set(store.entries("queue")) == {"live", "stale"}
@@ -0,0 +1,58 @@
+from transcript_model import WordTranscript, stitch_segments
+
+
+WORDS = [
+    ("Hello", 0.0, 0.4, 0.9),
+    ("big", 0.5, 0.8, 1.0),
+    ("world", 1.0, 1.5, 0.5),
+    ("again", 2.0, 2.4, 0.8)
+]
+
+
+def test_words_round_trip_through_the_stored_transcript():
+    transcript = WordTranscript.from_words(WORDS)
+    loaded = WordTranscript.from_transcript({"text": transcript.text, "words": transcript.to_dict()})
+    assert loaded.text == "Hello big world again"
+    assert len(loaded) == 4
+    assert loaded.word(2) == {"word": "world", "start": 1.0, "end": 1.5, "confidence": 0.5019607843137255}
+
+
+def test_transcript_without_word_columns_has_no_word_timings():
+    assert WordTranscript.from_transcript({"text": "Hello"}) is None
+    assert WordTranscript.from_transcript({"text": "Hello", "words": {"format": "unknown"}}) is None
+
+
+def test_whitespace_inside_words_is_removed():
+    transcript = WordTranscript.from_words([("New York", 0.0, 1.0, 1.0), (" ", 1.0, 1.1, 1.0), ("City", 1.2, 1.5, 1.0)])
+    assert transcript.text == "NewYork City"
+    assert len(transcript) == 2
+
+
+def test_text_at_returns_the_words_in_the_window():
+    transcript = WordTranscript.from_words(WORDS)
+    assert transcript.text_at(0.6, window=1) == {"text": "big world", "start": 0.5, "end": 1.5, "index": 1}
+
+
+def test_find_is_case_insensitive_and_spans_words():
+    transcript = WordTranscript.from_words(WORDS)
+    assert transcript.find("BIG   world") == [{"start": 0.5, "end": 1.5, "index": 1}]
+    assert transcript.find("missing") == []
+
+
+def test_from_segments_spreads_words_across_each_segment():
+    transcript = WordTranscript.from_segments([{"text": "one two", "start": 10.0, "duration": 2.0}])
+    assert [transcript.word(i)["start"] for i in range(len(transcript))] == [10.0, 11.0]
+
+
+def test_stitch_segments_keeps_each_overlapping_word_once():
+    # Segments start at 0 and 300 seconds and overlap by 10, so the cut is at 305
+    first = [("a", 290.0, 290.5, 1.0), ("b", 304.0, 304.5, 1.0), ("c", 306.0, 306.5, 1.0)]
+    second = [("b", 304.0, 304.5, 1.0), ("c", 306.0, 306.5, 1.0), ("d", 308.0, 308.5, 1.0)]
+    stitched = stitch_segments([(0.0, first), (300.0, second)], overlap=10)
+    assert [word[0] for word in stitched] == ["a", "b", "c", "d"]
+    assert stitched[1] is first[1]
+    assert stitched[2] is second[1]
+
+
+def test_stitch_segments_of_one_segment_keeps_every_word():
+    assert stitch_segments([(0.0, WORDS)], overlap=10) == WORDS
@@ -0,0 +1,215 @@
+import base64
+import bisect
+from array import array
+
+# Serialization format written under transcript["words"]
+WORDS_FORMAT = "columns-v1"
+
+
+def _encode(values):
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode(typecode, data):
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+def stitch_segments(segments, overlap):
+    """
+    Join the words of overlapping segments into one sequence.
+
+    Where two segments overlap, words starting before the middle of the
+    overlap are taken from the earlier segment and the rest from the later
+    one, so no word is dropped or repeated at a boundary.
+
+    Args:
+        segments (list): (start offset, words) tuples in order, words being
+            (word, start seconds, end seconds, confidence) tuples
+        overlap (float): Seconds by which consecutive segments overlap
+
+    Returns:
+        list: Words of the whole file in order
+    """
+    stitched = []
+    for i, (offset, words) in enumerate(segments):
+        low = offset + overlap / 2 if i > 0 else float("-inf")
+        high = segments[i + 1][0] + overlap / 2 if i + 1 < len(segments) else float("inf")
+        stitched.extend(word for word in words if low <= word[1] < high)
+    return stitched
+
+
+class WordTranscript:
+    """
+    Word-level transcript kept in parallel array-backed columns.
+
+    The text is the words joined by single spaces. Alongside it are columns
+    holding each word's character offset in the text, its start and end time
+    in milliseconds and its confidence as a byte. Times are sorted, so the
+    word spoken at a given moment is a binary search.
+    """
+
+    def __init__(self, text, starts, ends, confidences):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.confidences = confidences
+
+        # Character offset of every word, derived from the text rather than stored
+        self.offsets = array("I")
+        position = 0
+        for word in text.split(" ") if text else []:
+            self.offsets.append(position)
+            position += len(word) + 1
+        self._lower_text = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        Build a transcript from recognized words.
+
+        Args:
+            words (list): (word, start seconds, end seconds, confidence) tuples in order
+        """
+        texts = []
+        starts = array("I")
+        ends = array("I")
+        confidences = array("B")
+        for word, start, end, confidence in words:
+            # Words are separated by single spaces, so they must not contain any
+            word = "".join(word.split())
+            if not word:
+                continue
+            texts.append(word)
+            # Keep starts sorted for binary search even if captions overlap
+            starts.append(max(int(round(start * 1000)), starts[-1] if starts else 0))
+            ends.append(int(round(end * 1000)))
+            confidences.append(max(0, min(255, int(round(confidence * 255)))))
+        return cls(" ".join(texts), starts, ends, confidences)
+
+    @classmethod
+    def from_segments(cls, segments, confidence=1.0):
+        """
+        Build a transcript from timed caption segments, spreading each
+        segment's duration evenly across its words.
+
+        Args:
+            segments (list): Dicts with "text", "start" and "duration" in seconds
+            confidence (float): Confidence given to every word
+        """
+        words = []
+        for segment in segments:
+            segment_words = segment["text"].split()
+            if not segment_words:
+                continue
+            step = segment["duration"] / len(segment_words)
+            for i, word in enumerate(segment_words):
+                start = segment["start"] + i * step
+                words.append((word, start, start + step, confidence))
+        return cls.from_words(words)
+
+    def to_dict(self):
+        """Serialize the time and confidence columns compactly; the text is stored once beside them."""
+        return {
+            "format": WORDS_FORMAT,
+            "starts": _encode(self.starts),
+            "ends": _encode(self.ends),
+            "confidences": _encode(self.confidences)
+        }
+
+    @classmethod
+    def from_transcript(cls, transcript):
+        """
+        Load the word columns of a stored transcript.
+
+        Args:
+            transcript (dict): A transcript with "text" and a serialized "words" entry
+
+        Returns:
+            WordTranscript: The transcript, or None if it has no word timings
+        """
+        columns = transcript.get("words")
+        if not columns or columns.get("format") != WORDS_FORMAT:
+            return None
+        return cls(
+            transcript["text"],
+            _decode("I", columns["starts"]),
+            _decode("I", columns["ends"]),
+            _decode("B", columns["confidences"])
+        )
+
+    def word(self, index):
+        """Get a word with its timing as a dict."""
+        start = self.offsets[index]
+        end = self.offsets[index + 1] - 1 if index + 1 < len(self.offsets) else len(self.text)
+        return {
+            "word": self.text[start:end],
+            "start": self.starts[index] / 1000,
+            "end": self.ends[index] / 1000,
+            "confidence": self.confidences[index] / 255
+        }
+
+    def index_at(self, seconds):
+        """Index of the word being spoken at a time, or the last word before it."""
+        return max(0, bisect.bisect_right(self.starts, int(seconds * 1000)) - 1)
+
+    def text_at(self, seconds, window=10):
+        """
+        Get the text spoken from a time onwards.
+
+        Args:
+            seconds (float): Time in the recording
+            window (float): Seconds of speech to return
+
+        Returns:
+            dict: The text, its start and end time, and the index of its first word
+        """
+        if not len(self):
+            return None
+        first = self.index_at(seconds)
+        last = max(first, bisect.bisect_left(self.starts, int((seconds + window) * 1000)) - 1)
+        start = self.offsets[first]
+        end = self.offsets[last + 1] - 1 if last + 1 < len(self.offsets) else len(self.text)
+        return {
+            "text": self.text[start:end],
+            "start": self.starts[first] / 1000,
+            "end": self.ends[last] / 1000,
+            "index": first
+        }
+
+    def find(self, phrase, limit=10):
+        """
+        Find when a phrase is spoken.
+
+        Matches are found by a case-insensitive search of the text, and each
+        match's character offset is mapped to its word by binary search.
+
+        Args:
+            phrase (str): Words to look for
+            limit (int): Maximum number of matches
+
+        Returns:
+            list: Matches with their start time, end time and word index, in order
+        """
+        phrase = " ".join(phrase.lower().split())
+        if not phrase or not len(self):
+            return []
+        if self._lower_text is None:
+            self._lower_text = self.text.lower()
+
+        matches = []
+        position = self._lower_text.find(phrase)
+        while position != -1 and len(matches) < limit:
+            first = bisect.bisect_right(self.offsets, position) - 1
+            last = bisect.bisect_right(self.offsets, position + len(phrase) - 1) - 1
+            matches.append({
+                "start": self.starts[first] / 1000,
+                "end": self.ends[last] / 1000,
+                "index": first
+            })
+            position = self._lower_text.find(phrase, position + 1)
+        return matches
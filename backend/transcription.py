@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from google_speech import start_transcription
+from audio_transcript import transcribe_audio as whisper_transcribe, model_pool, WHISPER_POOL_SIZE
+from transcript_model import WordTranscript
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Engine used when a task does not ask for one: "google" or "whisper"
+TRANSCRIPTION_ENGINE = os.environ.get("TRANSCRIPTION_ENGINE", "google")
+
+GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "your-bucket-name")
+
+# Whisper runs on local CPUs, one transcription per pooled model
+WHISPER_WORKERS = ThreadPoolExecutor(max_workers=WHISPER_POOL_SIZE, thread_name_prefix="whisper")
+
+
+class GoogleSpeechEngine:
+    """Google Speech-to-Text: segments recognized remotely, tracked by the STT poller."""
+
+    name = "google"
+
+    def start(self, audio_path, on_complete):
+        start_transcription(audio_path, on_complete, bucket_name=GCS_BUCKET_NAME)
+
+
+class WhisperEngine:
+    """Local Whisper transcription on a bounded pool of lazily loaded models."""
+
+    name = "whisper"
+
+    def start(self, audio_path, on_complete):
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        WHISPER_WORKERS.submit(self._run, audio_path, on_complete, time.time())
+
+    def _run(self, audio_path, on_complete, queued):
+        try:
+            on_complete(self.transcribe(audio_path, queued))
+        except Exception as e:
+            logger.error(f"Failed to transcribe audio with Whisper: {str(e)}", exc_info=True)
+            on_complete({"text": "", "confidence": 0, "error": str(e)})
+
+    def transcribe(self, audio_path, queued=None):
+        """
+        Transcribe audio into the same dictionary Google transcription returns.
+
+        Returns:
+            dict: Text, average word confidence, serialized word timings, and
+            under "stt" the engine, model and timings
+        """
+        started = time.time()
+        result = whisper_transcribe(audio_path, word_timestamps=True)
+
+        words = [
+            (word["word"], word["start"], word["end"], word.get("probability", 0))
+            for segment in result["segments"]
+            for word in segment.get("words", [])
+        ]
+        word_transcript = WordTranscript.from_words(words)
+        avg_confidence = sum(word[3] for word in words) / len(words) if words else 0
+        logger.info(f"Whisper transcription completed in {time.time() - started:.1f}s")
+
+        return {
+            "text": word_transcript.text,
+            "confidence": avg_confidence,
+            "words": word_transcript.to_dict(),
+            "stt": {
+                "path": "whisper",
+                "model": model_pool.model_name,
+                "duration": result["segments"][-1]["end"] if result["segments"] else 0,
+                "segments": 1,
+                "timings": {
+                    "queued": started - (queued or started),
+                    "recognize": time.time() - started,
+                    "total": time.time() - (queued or started)
+                }
+            }
+        }
+
+
+ENGINES = {engine.name: engine for engine in (GoogleSpeechEngine(), WhisperEngine())}
+
+
+def get_engine(name=None):
+    """
+    Get a transcription engine.
+
+    Args:
+        name (str): "google" or "whisper", defaults to TRANSCRIPTION_ENGINE
+
+    Raises:
+        ValueError: If the engine is unknown
+    """
+    name = name or TRANSCRIPTION_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcription engine: {name}")
+    return ENGINES[name]
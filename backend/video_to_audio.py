@@ -1,4 +1,14 @@
+import os
+import time
+import logging
+import tempfile
+import subprocess
 from moviepy.video.io.VideoFileClip import VideoFileClip
+from media_tools import FFMPEG_BINARY, probe_duration, read_stderr_tail
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # video_path = "Reinforcement_Learning.mp4"
 # audio_output = "output_audio.mp3"
@@ -6,6 +16,85 @@ from moviepy.video.io.VideoFileClip import VideoFileClip
 # clip = VideoFileClip(video_path)
 # clip.audio.write_audiofile(audio_output)
 
+
+class ExtractionCancelled(Exception):
+    """Raised when audio extraction is stopped by its cancellation hook."""
+
+
 def convert_video_to_audio(video_path, audio_output):
+    """Decode the video with moviepy and re-encode its audio, kept for comparison with extract_audio."""
     clip = VideoFileClip(video_path)
-    clip.audio.write_audiofile(audio_output)
\ No newline at end of file
+    clip.audio.write_audiofile(audio_output)
+
+
+def extraction_command(video_path, audio_output):
+    """
+    Build the ffmpeg command extracting 16 kHz mono speech audio in one pass.
+
+    The codec follows the output extension: FLAC for .flac, LINEAR16 PCM
+    for .wav. The video stream is never decoded.
+    """
+    codec = "pcm_s16le" if audio_output.endswith(".wav") else "flac"
+    return [
+        FFMPEG_BINARY, "-v", "error", "-y", "-nostdin",
+        "-i", video_path,
+        "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", "16000", "-c:a", codec,
+        "-progress", "pipe:1", "-nostats",
+        audio_output
+    ]
+
+
+def extract_audio(video_path, audio_output, on_progress=None, should_cancel=None):
+    """
+    Stream a video's audio track through ffmpeg into 16 kHz mono FLAC or WAV.
+
+    Args:
+        video_path (str): Path to the video file
+        audio_output (str): Path of the audio file to write (.flac or .wav)
+        on_progress (callable): Called with the percent of the input processed
+        should_cancel (callable): Polled as ffmpeg reports progress; returning
+            True stops the extraction
+
+    Raises:
+        ExtractionCancelled: If should_cancel asked to stop
+        RuntimeError: If ffmpeg fails
+    """
+    try:
+        duration = probe_duration(video_path)
+    except (subprocess.CalledProcessError, ValueError):
+        duration = None
+    started = time.time()
+    # Errors go to a file rather than a pipe: a corrupt input can log more than a
+    # pipe buffer holds, and ffmpeg would block on it while progress is read
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        extraction_command(video_path, audio_output),
+        stdout=subprocess.PIPE, stderr=stderr_file, text=True
+    )
+
+    try:
+        # -progress writes key=value lines, ending each report with progress=...
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and duration and on_progress and value.isdigit():
+                on_progress(min(100.0, int(value) / 1e6 / duration * 100))
+            elif key == "progress" and should_cancel and should_cancel():
+                process.kill()
+                process.wait()
+                raise ExtractionCancelled(f"Audio extraction cancelled for {video_path}")
+
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to extract audio: {read_stderr_tail(stderr_file).strip()}")
+    except BaseException:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if os.path.exists(audio_output):
+            os.remove(audio_output)
+        raise
+    finally:
+        process.stdout.close()
+        stderr_file.close()
+
+    logger.info(f"Extracted audio from {video_path} in {time.time() - started:.1f}s")